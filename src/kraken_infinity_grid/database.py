@@ -7,15 +7,18 @@
 
 """Module implementing the database connection and handling of interactions."""
 
+from bisect import bisect_left, insort
+from contextlib import contextmanager
 from datetime import datetime
 from importlib.metadata import version
 from logging import getLogger
-from typing import Any, Self
+from typing import Any, Callable, Generator, Self
 
 from sqlalchemy import (
     Column,
     DateTime,
     Float,
+    Index,
     Integer,
     MetaData,
     String,
@@ -30,6 +33,7 @@ from sqlalchemy import (
 )
 from sqlalchemy.engine.result import MappingResult
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 LOG = getLogger(__name__)
 
@@ -48,8 +52,15 @@ class DBConnect:
         sqlite_file: str | None = None,
     ) -> None:
         LOG.info("Connecting to the database...")
+        engine_kwargs: dict = {}
         if in_memory:
             engine = "sqlite:///:memory:"
+            # The database is accessed from within a worker thread, so all
+            # threads must share the same connection to the in-memory database.
+            engine_kwargs |= {
+                "poolclass": StaticPool,
+                "connect_args": {"check_same_thread": False},
+            }
         elif sqlite_file:
             engine = f"sqlite:///{sqlite_file}"
         else:
@@ -60,21 +71,65 @@ class DBConnect:
                 engine += f"{db_host}:{db_port}"
             engine += f"/{db_name}"
 
-        self.engine = create_engine(engine)
+        self.engine = create_engine(engine, **engine_kwargs)
         self.session = sessionmaker(bind=self.engine)()
         self.metadata = MetaData()
+        self.__in_transaction: bool = False
+        # Functions invalidating in-memory copies of the tables, which no
+        # longer match the database after a rollback.
+        self.__rollback_hooks: list[Callable[[], None]] = []
+
+    def add_rollback_hook(self: Self, hook: Callable[[], None]) -> None:
+        """Register a function to be called after rolling back a transaction."""
+        self.__rollback_hooks.append(hook)
 
     def init_db(self: Self) -> None:
         """Create tables if they do not exist and pre-fill with default rows."""
         LOG.info("- Initializing tables...")
         self.metadata.create_all(self.engine)
+        # Tables of existing databases don't get new indexes via create_all.
+        for table in self.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
         LOG.info("- Database initialized.")
 
+    @contextmanager
+    def transaction(self: Self) -> Generator[None, None, None]:
+        """
+        Context manager that bundles all inserts, updates, and deletions that
+        are executed within its scope into a single commit.
+
+        If any exception interrupts the block, the changes are rolled back, so
+        that no partial bookkeeping is persisted. Nested calls join the
+        outermost transaction.
+        """
+        if self.__in_transaction:
+            yield
+            return
+
+        self.__in_transaction = True
+        try:
+            yield
+            if self.session.in_transaction():
+                self.session.commit()
+        except BaseException:
+            self.session.rollback()
+            for hook in self.__rollback_hooks:
+                hook()
+            raise
+        finally:
+            self.__in_transaction = False
+
+    def commit(self: Self) -> None:
+        """Commit the current changes unless a transaction is in progress."""
+        if not self.__in_transaction:
+            self.session.commit()
+
     def add_row(self: Self, table: Table, **kwargs: Any) -> None:
         """Insert a row into the specified table."""
         LOG.debug("Inserting a row into '%s': %s", table, kwargs)
         self.session.execute(table.insert().values(**kwargs))
-        self.session.commit()
+        self.commit()
 
     def get_rows(
         self: Self,
@@ -125,7 +180,7 @@ class DBConnect:
             .values(**updates)
         )
         self.session.execute(query)
-        self.session.commit()
+        self.commit()
 
     def delete_row(self: Self, table: Table, filters: dict) -> None:
         """Delete rows from the specified table matching filters."""
@@ -134,7 +189,7 @@ class DBConnect:
             *(table.c[column] == value for column, value in filters.items()),
         )
         self.session.execute(query)
-        self.session.commit()
+        self.commit()
 
     def close(self: Self) -> None:
         """Close database connections properly to avoid resource leaks."""
@@ -163,7 +218,46 @@ class Orderbook:
             Column("side", String, nullable=False),
             Column("price", Float, nullable=False),
             Column("volume", Float, nullable=False),
+            # Orders are removed and updated by txid.
+            Index("ix_orderbook_txid", "txid"),
         )
+        # In-memory index of the orders (txid -> (side, price)) and the sorted
+        # prices per side, built lazily from the table and maintained on
+        # modification.
+        self.__orders: dict[str, tuple[str, float]] = {}
+        self.__prices: dict[str, list[tuple[float, str]]] = {}
+        self.__is_indexed: bool = False
+        db.add_rollback_hook(self.__invalidate_index)
+
+    def __invalidate_index(self: Self) -> None:
+        """Rebuild the in-memory index from the table on next access."""
+        self.__is_indexed = False
+
+    def __get_index(self: Self) -> dict[str, tuple[str, float]]:
+        """Return the in-memory index of the orders, (re)building it if required."""
+        if not self.__is_indexed:
+            LOG.debug("Building the in-memory index of the orderbook...")
+            self.__orders = {}
+            self.__prices = {}
+            for order in self.__db.get_rows(
+                self.__table,
+                filters={"userref": self.__userref},
+            ):
+                self.__index_add(order["txid"], order["side"], order["price"])
+            self.__is_indexed = True
+        return self.__orders
+
+    def __index_add(self: Self, txid: str, side: str, price: float | str) -> None:
+        """Add an order to the in-memory index."""
+        self.__orders[txid] = (side, float(price))
+        insort(self.__prices.setdefault(side, []), (float(price), txid))
+
+    def __index_remove(self: Self, txid: str) -> None:
+        """Remove an order from the in-memory index."""
+        if (order := self.__orders.pop(txid, None)) is not None:
+            side, price = order
+            prices = self.__prices[side]
+            del prices[bisect_left(prices, (price, txid))]
 
     def add(self: Self, order: dict) -> None:
         """Add an order to the orderbook."""
@@ -177,6 +271,14 @@ class Orderbook:
             price=order["descr"]["price"],
             volume=order["vol"],
         )
+        if self.__is_indexed and order["txid"] not in self.__orders:
+            self.__index_add(
+                order["txid"],
+                order["descr"]["type"],
+                order["descr"]["price"],
+            )
+        else:
+            self.__is_indexed = False
 
     def get_orders(
         self: Self,
@@ -212,6 +314,10 @@ class Orderbook:
             self.__table,
             filters=filters | {"userref": self.__userref},
         )
+        if self.__is_indexed and filters.keys() == {"txid"}:
+            self.__index_remove(filters["txid"])
+        else:
+            self.__is_indexed = False
 
     def update(self: Self, updates: dict, filters: dict | None = None) -> None:
         """
@@ -243,18 +349,25 @@ class Orderbook:
             filters=filters | {"userref": self.__userref},
             updates=prepared_updates,
         )
+        if prepared_updates.keys() & {"txid", "side", "price"}:
+            self.__is_indexed = False
 
     def count(
         self: Self,
         filters: dict | None = None,
         exclude: dict | None = None,
     ) -> int:
-        """Count orders in the orderbook."""
+        """
+        Count orders in the orderbook. The total number of orders is served
+        from memory without querying the database.
+        """
         LOG.debug(
             "Counting orders in the orderbook with filters: %s and exclude: %s",
             filters,
             exclude,
         )
+        if not filters and not exclude:
+            return len(self.__get_index())
         if not filters:
             filters = {}
         filters |= {"userref": self.__userref}
@@ -272,6 +385,40 @@ class Orderbook:
             )
         return self.__db.session.execute(query).scalar()  # type: ignore[no-any-return]
 
+    def exists(self: Self, txid: str) -> bool:
+        """Check if an order is present in the orderbook."""
+        return txid in self.__get_index()
+
+    def count_side(self: Self, side: str, exclude_txid: str | None = None) -> int:
+        """
+        Count the orders of a side in the orderbook, optionally excluding a
+        specific order. Served from memory without querying the database.
+        """
+        orders = self.__get_index()
+        return len(self.__prices.get(side, ())) - (
+            exclude_txid is not None
+            and exclude_txid in orders
+            and orders[exclude_txid][0] == side
+        )
+
+    def get_prices(
+        self: Self,
+        side: str,
+        limit: int | None = None,
+        *,
+        descending: bool = False,
+    ) -> list[float]:
+        """
+        Return the sorted prices of the orders of a side, optionally limited to
+        the first ``limit`` prices. Served from memory without querying the
+        database.
+        """
+        self.__get_index()
+        prices = self.__prices.get(side, [])
+        if descending:
+            prices = prices[::-1]
+        return [price for price, _ in prices[:limit]]
+
 
 class Configuration:
     """Table containing information about the bots config."""
@@ -323,30 +470,56 @@ class Configuration:
                 last_telegram_update=datetime.now(),
             )
 
+        # The configuration is only modified via this class, so it is cached
+        # after being read once and kept in sync on updates (write-through).
+        self.__cache: dict | None = None
+        db.add_rollback_hook(self.__invalidate_cache)
+
+    def __invalidate_cache(self: Self) -> None:
+        """Read the configuration from the table on next access."""
+        self.__cache = None
+
     def get(self: Self, filters: dict | None = None) -> dict:
-        """Get configuration from the table."""
+        """
+        Get configuration from the table. The configuration is served from
+        memory if no filters are passed.
+        """
         LOG.debug(
             "Getting configuration from the table 'configuration' with filter: %s",
             filters,
         )
-        if not filters:
-            filters = {}
+        if not filters and self.__cache is not None:
+            return self.__cache.copy()
 
         if result := self.__db.get_rows(
             self.__table,
-            filters=filters | {"userref": self.__userref},
+            filters=(filters or {}) | {"userref": self.__userref},
         ):
-            return next(result)
+            configuration = dict(next(result))
+            if not filters:
+                self.__cache = configuration.copy()
+            return configuration
         raise ValueError(f"No configuration found for passed {filters=}!")
 
     def update(self: Self, updates: dict) -> None:
-        """Update configuration in the table."""
+        """
+        Update configuration in the table. Only the passed columns are written,
+        and nothing is written if they already hold the passed values.
+        """
+        if self.__cache is not None and all(
+            self.__cache.get(column) == value for column, value in updates.items()
+        ):
+            LOG.debug("Configuration is already up to date: %s", updates)
+            return
+
         LOG.debug("Updating configuration in the table: %s", updates)
         self.__db.update_row(
             self.__table,
             filters={"userref": self.__userref},
             updates=updates,
         )
+        if self.__cache is not None:
+            self.__cache |= updates
 
 
 class UnsoldBuyOrderTXIDs:
@@ -370,6 +543,26 @@ class UnsoldBuyOrderTXIDs:
             Column("txid", String, nullable=False),  # corresponding buy order
             Column("price", Float, nullable=False),  # price at which to sell
         )
+        # In-memory set of the txids, loaded lazily from the table and
+        # maintained on modification.
+        self.__txids: set[str] | None = None
+        db.add_rollback_hook(self.__invalidate_txids)
+
+    def __invalidate_txids(self: Self) -> None:
+        """Load the txids from the table on next access."""
+        self.__txids = None
+
+    def __get_txids(self: Self) -> set[str]:
+        """Return the in-memory set of txids, loading it if required."""
+        if self.__txids is None:
+            self.__txids = {
+                row["txid"]
+                for row in self.__db.get_rows(
+                    self.__table,
+                    filters={"userref": self.__userref},
+                )
+            }
+        return self.__txids
 
     def add(self: Self, txid: str, price: float) -> None:
         """Add a missed sell order to the table."""
@@ -383,6 +576,8 @@ class UnsoldBuyOrderTXIDs:
             txid=txid,
             price=price,
         )
+        if self.__txids is not None:
+            self.__txids.add(txid)
 
     def remove(self: Self, txid: str) -> None:
         """Remove txid from the table."""
@@ -398,6 +593,12 @@ class UnsoldBuyOrderTXIDs:
                 "txid": txid,
             },
         )
+        if self.__txids is not None:
+            self.__txids.discard(txid)
+
+    def exists(self: Self, txid: str) -> bool:
+        """Check if a txid is present in the table."""
+        return txid in self.__get_txids()
 
     def get(self: Self, filters: dict | None = None) -> MappingResult:
         """Retrieve unsold buy order txids from the table."""
@@ -414,14 +615,17 @@ class UnsoldBuyOrderTXIDs:
         )
 
     def count(self: Self, filters: dict | None = None) -> int:
-        """Count unsold buy order txids from the table."""
+        """
+        Count unsold buy order txids from the table. The total number of txids
+        is served from memory without querying the database.
+        """
         LOG.debug(
             "Count unsold buy order txids from the table unsold_buy_order_txids"
             " table with filters: %s",
             filters,
         )
         if not filters:
-            filters = {}
+            return len(self.__get_txids())
         filters |= {"userref": self.__userref}
 
         query = (
@@ -11,14 +11,16 @@ import asyncio
 import signal
 import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from decimal import Decimal
+from decimal import ROUND_DOWN, Decimal
+from functools import cache, partial
 from importlib.metadata import version
 from logging import getLogger
 from time import sleep
-from types import SimpleNamespace
-from typing import Iterable, Optional, Self
+from typing import Any, Callable, Iterable, Optional, Self
 
 from kraken.exceptions import (
     KrakenAuthenticationError,
@@ -42,6 +44,19 @@ from kraken_infinity_grid.telegram import Telegram
 LOG = getLogger(__name__)
 
 
+@cache
+def _quantum(decimals: int) -> Decimal:
+    """Returns the smallest step for the given number of decimal places."""
+    return Decimal(1).scaleb(-decimals)
+
+
+@dataclass(slots=True)
+class Ticker:
+    """Holds the latest price of the traded asset pair."""
+
+    last: float
+
+
 class KrakenInfinityGridBot(SpotWSClient):
     """
     The KrakenInfinityGridBot class implements the infinity grid trading bot
@@ -176,10 +191,13 @@ class KrakenInfinityGridBot(SpotWSClient):
         self.amount_per_grid: float = float(config["amount_per_grid"])
         self.amount_per_grid_plus_fee: float | None = config.get("fee")
 
-        self.ticker: SimpleNamespace = None
+        self.ticker: Ticker | None = None
         self.max_investment: float = config["max_investment"]
         self.n_open_buy_orders: int = config["n_open_buy_orders"]
         self.fee: float | None = config.get("fee")
+        # Sell prices are multiplied with this factor when computing the volume
+        # of sell orders in order to respect the fees of buying and selling.
+        self.sell_fee_factor: Decimal | None = None
         self.base_currency: str = config["base_currency"]
         self.quote_currency: str = config["quote_currency"]
 
@@ -189,11 +207,22 @@ class KrakenInfinityGridBot(SpotWSClient):
         self.zbase_currency: str | None = None  # XXBT
         self.xquote_currency: str | None = None  # ZEUR
         self.cost_decimals: int | None = None  # 5 for EUR, i.e., 0.00001 EUR
+        self.pair_decimals: int | None = None  # 1 for BTC/EUR, i.e., 0.1 EUR
+        self.lot_decimals: int | None = None  # 8 for BTC, i.e., 0.00000001 BTC
+        self.ordermin: Decimal | None = None  # Minimum volume of an order
+        self.costmin: Decimal | None = None  # Minimum price of an order
 
         # If the algorithm receives execution messages before being ready to
         # trade, they will be stored here and processed later.
         ##
         self.__missed_messages: list[dict] = []
+        # Ensures that the preparation for trading runs only once, even if
+        # messages of both channels arrive while it is still running.
+        self.__setup_lock: asyncio.Lock = asyncio.Lock()
+
+        # Time of the last price update that was saved to the database.
+        ##
+        self.__last_price_time_saved: datetime = datetime.min
 
         # Define the Kraken clients
         ##
@@ -219,6 +248,18 @@ class KrakenInfinityGridBot(SpotWSClient):
         )
         self.database.init_db()
 
+        # All interactions with the Kraken REST API and the database are
+        # executed within a single worker thread. This keeps the event loop
+        # responsive while the order management is blocked by requests and
+        # retries and ensures that the database session is never used
+        # concurrently. Since there is only one worker, the tasks are processed
+        # in the order they were submitted.
+        ##
+        self.__worker: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="kraken-infinity-grid",
+        )
+
         # Instantiate the algorithm's components
         ##
         self.om = OrderManager(strategy=self)
@@ -231,7 +272,7 @@ class KrakenInfinityGridBot(SpotWSClient):
             exception_chat_id=config["exception_chat_id"],
         )
 
-    async def on_message(  # noqa: C901, PLR0912, PLR0911
+    async def on_message(  # noqa: C901, PLR0911
         self: Self,
         message: dict | list,
     ) -> None:
@@ -273,7 +314,7 @@ class KrakenInfinityGridBot(SpotWSClient):
             ):
                 self.state_machine.facts["ticker_channel_connected"] = True
                 # Set ticker the first time to have the ticker set during setup.
-                self.ticker = SimpleNamespace(last=float(message["data"][0]["last"]))
+                self.ticker = Ticker(last=float(message["data"][0]["last"]))
                 LOG.info("- Subscribed to ticker channel successfully!")
 
             elif (
@@ -288,12 +329,22 @@ class KrakenInfinityGridBot(SpotWSClient):
                 and self.state_machine.facts["executions_channel_connected"]
                 and not self.state_machine.facts["ready_to_trade"]
             ):
-                self.sm.prepare_for_trading()
-
-                # If there are any missed messages, process them now.
-                for msg in self.__missed_messages:
-                    await self.on_message(msg)
-                self.__missed_messages = []
+                async with self.__setup_lock:
+                    # The setup may have been done by another message while
+                    # waiting for the lock.
+                    if not self.__is_ready_to_trade():
+                        await self.__run_in_worker(self.sm.prepare_for_trading)
+
+                    # If there are any missed messages, process them now. This
+                    # is done while holding the lock, so that they are handled
+                    # before any message that arrived during the setup.
+                    if self.__is_ready_to_trade():
+                        missed_messages, self.__missed_messages = (
+                            self.__missed_messages,
+                            [],
+                        )
+                        for msg in missed_messages:
+                            await self.__handle_message(msg)
 
             if not self.state_machine.facts["ready_to_trade"]:
                 if channel == "executions":
@@ -306,43 +357,107 @@ class KrakenInfinityGridBot(SpotWSClient):
                 # updated.
                 return
 
-            # =====================================================================
-            # Handle ticker and execution messages
-
-            if (
-                channel == "ticker"
-                and (data := message.get("data"))
-                and data[0].get("symbol") == self.symbol
-            ):
-                self.configuration.update({"last_price_time": datetime.now()})
-
-                self.ticker = SimpleNamespace(last=float(data[0]["last"]))
-                if self.unsold_buy_order_txids.count() != 0:
-                    self.om.add_missed_sell_orders()
-
-                self.om.check_price_range()
-
-            elif channel == "executions" and (data := message.get("data", [])):
-                if message.get("type") == "snapshot":
-                    # Snapshot data is not interesting, as this is handled
-                    # during sync with upstream.
-                    return
+            # Messages that arrive while the missed messages are processed
+            # wait for them, so that all messages are handled in order.
+            if self.__setup_lock.locked():
+                async with self.__setup_lock:
+                    pass
 
-                for execution in data:
-                    LOG.debug("Got execution: %s", execution)
-                    match execution["exec_type"]:
-                        case "new":
-                            self.om.assign_order_by_txid(execution["order_id"])
-                        case "filled":
-                            self.om.handle_filled_order_event(execution["order_id"])
-                        case "canceled" | "expired":
-                            self.om.handle_cancel_order(execution["order_id"])
+            await self.__handle_message(message)
 
         except Exception as exc:  # noqa: BLE001
             LOG.error(msg="Exception while processing message.", exc_info=exc)
             self.state_machine.transition_to(States.ERROR)
             return
 
+    def __is_ready_to_trade(self: Self) -> bool:
+        """Returns whether the setup is done and the algorithm can trade."""
+        return self.state_machine.facts["ready_to_trade"]
+
+    async def __handle_message(self: Self, message: dict) -> None:
+        """Handles a ticker or executions message once ready to trade."""
+        channel = message.get("channel")
+        if (
+            channel == "ticker"
+            and (data := message.get("data"))
+            and data[0].get("symbol") == self.symbol
+        ):
+            await self.__run_in_worker(
+                self.__on_ticker_update,
+                float(data[0]["last"]),
+            )
+
+        elif channel == "executions" and (data := message.get("data", [])):
+            if message.get("type") == "snapshot":
+                # Snapshot data is not interesting, as this is handled
+                # during sync with upstream.
+                return
+
+            await self.__run_in_worker(self.__on_executions, data)
+
+    def __on_ticker_update(self: Self, last: float) -> None:
+        """
+        Handles a new ticker update of the traded asset pair. Gets executed
+        within the worker thread.
+        """
+        # Update the existing ticker in-place to avoid allocating a new object
+        # on every ticker message. This is done within the worker thread, so
+        # that the price doesn't change while handling other events.
+        self.ticker.last = last
+
+        # The time of the last price update is only used to detect stale
+        # prices, so it is sufficient to save it once every few seconds
+        # instead of writing to the database on every ticker message.
+        if (now := datetime.now()) - self.__last_price_time_saved > timedelta(
+            seconds=5,
+        ):
+            self.configuration.update({"last_price_time": now})
+            self.__last_price_time_saved = now
+
+        if self.unsold_buy_order_txids.count() != 0:
+            self.om.add_missed_sell_orders()
+
+        self.om.check_price_range()
+
+    def __on_executions(self: Self, executions: list[dict]) -> None:
+        """
+        Handles new, filled, and canceled orders. Gets executed within the
+        worker thread.
+        """
+        # Fetch the details of multiple filled orders at once, so that they are
+        # served from memory when handling the individual fill events.
+        filled_txids = [
+            execution["order_id"]
+            for execution in executions
+            if execution["exec_type"] == "filled"
+        ]
+        if len(filled_txids) > 1:
+            self.om.get_orders_info_bulk(txids=filled_txids)
+
+        for execution in executions:
+            LOG.debug("Got execution: %s", execution)
+            match execution["exec_type"]:
+                case "new":
+                    self.om.assign_order_by_txid(execution["order_id"])
+                case "filled":
+                    self.om.handle_filled_order_event(execution["order_id"])
+                case "canceled" | "expired":
+                    self.om.handle_cancel_order(execution["order_id"])
+
+    async def __run_in_worker(
+        self: Self,
+        func: Callable,
+        *args: Any,
+    ) -> Any:  # noqa: ANN401
+        """
+        Executes a blocking function within the worker thread and waits for
+        its result without blocking the event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__worker,
+            partial(func, *args),
+        )
+
     # ==========================================================================
 
     async def run(self: Self) -> None:
@@ -455,7 +570,10 @@ class KrakenInfinityGridBot(SpotWSClient):
         )
 
         # Set this initially in case the DB contains a value that is too old.
-        self.configuration.update({"last_price_time": datetime.now()})
+        await self.__run_in_worker(
+            self.configuration.update,
+            {"last_price_time": datetime.now()},
+        )
 
         # ======================================================================
         # Main Loop: Run until interruption
@@ -464,7 +582,7 @@ class KrakenInfinityGridBot(SpotWSClient):
         # exceptions in the websocket connection.
         while not self.exception_occur:
             try:
-                conf = self.configuration.get()
+                conf = await self.__run_in_worker(self.configuration.get)
                 last_hour = (now := datetime.now()) - timedelta(hours=1)
 
                 if self.state_machine.state == States.RUNNING and (
@@ -473,7 +591,7 @@ class KrakenInfinityGridBot(SpotWSClient):
                     or conf["last_telegram_update"] < last_hour
                 ):
                     # Send update once per hour to Telegram
-                    self.t.send_telegram_update()
+                    await self.__run_in_worker(self.t.send_telegram_update)
 
                 if (
                     not self.skip_price_check
@@ -507,16 +625,24 @@ class KrakenInfinityGridBot(SpotWSClient):
         1. Stops the websocket connections and aiohttp sessions managed by the
            python-kraken-sdk
         2. Stops the connection to the database.
-        3. Notifies the user via Telegram about the termination.
+        3. Notifies the user via Telegram about the termination and sends
+           all pending messages.
         4. Exits the algorithm.
         """
         await self.close()
+        self.om.stop()
+        # Wait for the running task without blocking the event loop.
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            partial(self.__worker.shutdown, wait=True, cancel_futures=True),
+        )
         self.database.close()
 
         self.t.send_to_telegram(
             message=f"{self.name}\n{self.symbol} terminated.\nReason: {reason}",
             exception=exception,
         )
+        self.t.close()
         sys.exit(exception)
 
     def __check_kraken_status(self: Self, tries: int = 0) -> None:
@@ -593,13 +719,15 @@ class KrakenInfinityGridBot(SpotWSClient):
         quote_balance: Decimal = Decimal(0)
         quote_available: Decimal = Decimal(0)
 
-        for symbol, data in self.user.get_balances().items():
-            if symbol == self.zbase_currency:
-                base_balance = Decimal(data["balance"])
-                base_available = base_balance - Decimal(data["hold_trade"])
-            elif symbol == self.xquote_currency:
-                quote_balance = Decimal(data["balance"])
-                quote_available = quote_balance - Decimal(data["hold_trade"])
+        # The balances are keyed by the asset's symbol, so we can directly look
+        # up the two currencies of interest instead of scanning all entries.
+        fetched_balances = self.user.get_balances()
+        if base := fetched_balances.get(self.zbase_currency):
+            base_balance = Decimal(base["balance"])
+            base_available = base_balance - Decimal(base["hold_trade"])
+        if quote := fetched_balances.get(self.xquote_currency):
+            quote_balance = Decimal(quote["balance"])
+            quote_available = quote_balance - Decimal(quote["hold_trade"])
 
         balances = {
             "base_balance": float(base_balance),
@@ -610,11 +738,55 @@ class KrakenInfinityGridBot(SpotWSClient):
         LOG.debug("Retrieved balances: %s", balances)
         return balances
 
+    def truncate(
+        self: Self,
+        amount: Decimal | float | str,
+        amount_type: str,
+    ) -> str:
+        """
+        Returns the string representation of the amount using the number of
+        decimal places allowed by Kraken for the traded asset pair.
+
+        Other than ``Trade.truncate`` of the python-kraken-sdk, this function
+        uses the asset pair parameters retrieved during the setup of the
+        algorithm instead of requesting them for every call.
+        """
+        if amount_type not in {"price", "volume"}:
+            raise ValueError("Amount type must be 'volume' or 'price'!")
+
+        if not isinstance(amount, Decimal):
+            amount = Decimal(str(amount))
+
+        if amount_type == "price":
+            if self.costmin > amount:
+                raise ValueError(f"Price is less than the costmin: {self.costmin}!")
+            decimals = self.pair_decimals
+        else:  # amount_type == "volume"
+            if self.ordermin > amount:
+                raise ValueError(
+                    f"Volume is less than the ordermin: {self.ordermin}!",
+                )
+            decimals = self.lot_decimals
+
+        return f"{amount.quantize(_quantum(decimals), rounding=ROUND_DOWN):f}"
+
     def get_current_buy_prices(self: Self) -> Iterable[float]:
-        """Returns a generator of the prices of open buy orders."""
+        """
+        Returns a generator of the prices of open buy orders in descending
+        order.
+        """
         LOG.debug("Getting current buy prices...")
-        for order in self.orderbook.get_orders(filters={"side": "buy"}):
-            yield order["price"]
+        yield from self.orderbook.get_prices(side="buy", descending=True)
+
+    def get_lowest_buy_price(self: Self) -> float | None:
+        """
+        Returns the price of the lowest open buy order or None if there are no
+        open buy orders.
+        """
+        LOG.debug("Getting lowest buy price...")
+        if prices := self.orderbook.get_prices(side="buy", limit=1):
+            return prices[0]
+        return None
 
     def get_order_price(
         self: Self,
@@ -628,10 +800,10 @@ class KrakenInfinityGridBot(SpotWSClient):
         """
         LOG.debug("Computing the order price...")
         order_price: float
-        price_of_highest_buy = self.configuration.get()["price_of_highest_buy"]
         last_price = float(last_price)
 
         if side == "sell":  # New order is a sell
+            price_of_highest_buy = self.configuration.get()["price_of_highest_buy"]
             if self.strategy == "SWING" and extra_sell:
                 # Extra sell order when SWING
                 # 2x interval above [last close price | price of highest buy]
@@ -680,6 +852,9 @@ class KrakenInfinityGridBot(SpotWSClient):
     @property
     def max_investment_reached(self: Self) -> bool:
         """Returns True if the maximum investment is reached."""
+        # The investment is computed from all open orders, so it is only
+        # computed once.
+        investment = self.investment
         return (
-            self.max_investment <= self.investment + self.amount_per_grid_plus_fee
-        ) or (self.max_investment <= self.investment)
+            self.max_investment <= investment + self.amount_per_grid_plus_fee
+        ) or (self.max_investment <= investment)
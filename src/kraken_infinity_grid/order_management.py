@@ -10,14 +10,18 @@
 from __future__ import annotations
 
 import logging
+from collections import OrderedDict
 from decimal import Decimal
-from time import sleep
-from typing import TYPE_CHECKING, Self
+from itertools import pairwise
+from threading import Event
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Self, cast
 
 from kraken.exceptions import KrakenUnknownOrderError
 
 from kraken_infinity_grid.exceptions import GridBotStateError
 from kraken_infinity_grid.state_machine import States
+from kraken_infinity_grid.telegram import EXECUTED_ORDER_MESSAGE
 
 if TYPE_CHECKING:
     # To avoid circular import for type checking
@@ -25,6 +29,61 @@ if TYPE_CHECKING:
 
 LOG: logging.Logger = logging.getLogger(__name__)
 
+#: Maximum number of txids that can be queried via a single QueryOrders request.
+MAX_TXIDS_PER_QUERY: int = 50
+
+#: Maximum number of finalized orders whose details are kept in memory.
+ORDER_INFO_CACHE_SIZE: int = 100
+
+#: Order states that can't change anymore.
+FINAL_ORDER_STATES: frozenset[str] = frozenset({"closed", "canceled", "expired"})
+
+#: Maximum number of orders that can be cancelled via a single CancelOrderBatch
+#: request.
+MAX_ORDERS_PER_CANCEL_BATCH: int = 50
+
+#: Number of order placements/cancellations that can be done in a row without
+#: waiting.
+RATE_LIMIT_BURST: int = 10
+
+#: Sustained number of order placements/cancellations per second.
+RATE_LIMIT_PER_SECOND: float = 5.0
+
+
+class RateLimiter:
+    """
+    Token bucket used to pace the requests that add or cancel orders.
+
+    Tokens are refilled continuously, so subsequent requests only have to wait
+    in case the bucket has run empty.
+    """
+
+    def __init__(
+        self: RateLimiter,
+        max_tokens: float = RATE_LIMIT_BURST,
+        refill_per_sec: float = RATE_LIMIT_PER_SECOND,
+    ) -> None:
+        self.__max_tokens = max_tokens
+        self.__refill_per_sec = refill_per_sec
+        self.__tokens = max_tokens
+        self.__last_refill = monotonic()
+
+    def acquire(self: RateLimiter, cost: float = 1) -> None:
+        """Take ``cost`` tokens from the bucket, waiting if not enough left."""
+        now = monotonic()
+        self.__tokens = min(
+            self.__max_tokens,
+            self.__tokens + (now - self.__last_refill) * self.__refill_per_sec,
+        )
+        self.__last_refill = now
+
+        if self.__tokens < cost:
+            sleep((cost - self.__tokens) / self.__refill_per_sec)
+            self.__tokens = cost
+            self.__last_refill = monotonic()
+
+        self.__tokens -= cost
+
 
 class OrderManager:
     """Manages the orderbook and the order handling."""
@@ -32,6 +91,20 @@ class OrderManager:
     def __init__(self: OrderManager, strategy: KrakenInfinityGridBot) -> None:
         LOG.debug("Initializing the OrderManager...")
         self.__s = strategy
+        # Details of finalized orders, e.g. to avoid fetching a filled buy order
+        # again when placing its corresponding sell order.
+        self.__order_info_cache: OrderedDict[str, dict] = OrderedDict()
+        # Set on termination to abort waiting for orders to be closed upstream.
+        self.__stop_event = Event()
+        # Paces placing and cancelling orders to avoid being rate limited.
+        self.__rate_limiter = RateLimiter()
+        # The buy orders are shifted up if the price rises above the highest
+        # buy price times this factor. The interval doesn't change at runtime.
+        self.__shift_up_factor = (1 + strategy.interval) ** 2 * 1.001
+
+    def stop(self: OrderManager) -> None:
+        """Abort pending waits, e.g. for filled orders to be closed upstream."""
+        self.__stop_event.set()
 
     def add_missed_sell_orders(self: Self) -> None:
         """
@@ -81,8 +154,11 @@ class OrderManager:
             return
 
         if self.__s.pending_txids.count(filters={"txid": order_details["txid"]}) != 0:
-            self.__s.orderbook.add(order_details)
-            self.__s.pending_txids.remove(order_details["txid"])
+            # Moving the order from the pending txids to the orderbook is
+            # committed at once.
+            with self.__s.database.transaction():
+                self.__s.orderbook.add(order_details)
+                self.__s.pending_txids.remove(order_details["txid"])
         else:
             self.__s.orderbook.update(
                 order_details,
@@ -125,19 +201,29 @@ class OrderManager:
         """
         LOG.debug("Checking if distance between buy orders is too low...")
 
-        if len(buy_prices := list(self.__s.get_current_buy_prices())) == 0:
+        # The buy prices are already sorted in descending order, so the higher
+        # price of each pair of neighbouring buy orders that are too close to
+        # each other is collected in a single pass.
+        min_distance = self.__s.interval / 2
+        too_close_prices = [
+            higher
+            for higher, lower in pairwise(self.__s.get_current_buy_prices())
+            if higher == lower or (higher / lower) - 1 < min_distance
+        ]
+        if not too_close_prices:
             return
 
-        buy_prices.sort(reverse=True)
-        for i, price in enumerate(buy_prices[1:]):
-            if (
-                price == buy_prices[i]
-                or (buy_prices[i] / price) - 1 < self.__s.interval / 2
-            ):
-                for order in self.__s.orderbook.get_orders(filters={"side": "buy"}):
-                    if order["price"] == buy_prices[i]:
-                        self.handle_cancel_order(txid=order["txid"])
-                        break
+        txids_by_price: dict[float, list[str]] = {}
+        for order in self.__s.orderbook.get_orders(filters={"side": "buy"}):
+            txids_by_price.setdefault(order["price"], []).append(order["txid"])
+
+        self.__cancel_orders(
+            txids=[
+                txids_by_price[price].pop(0)
+                for price in too_close_prices
+                if txids_by_price.get(price)
+            ],
+        )
 
     def __check_n_open_buy_orders(self: OrderManager) -> None:
         """
@@ -148,31 +234,41 @@ class OrderManager:
             self.__s.n_open_buy_orders,
         )
         can_place_buy_order: bool = True
-        buy_prices: list[float] = list(self.__s.get_current_buy_prices())
 
         while (
-            (n_active_buy_orders := self.__s.orderbook.count(filters={"side": "buy"}))
+            (n_active_buy_orders := self.__s.orderbook.count_side(side="buy"))
             < self.__s.n_open_buy_orders
             and can_place_buy_order
             and self.__s.pending_txids.count() == 0
             and not self.__s.max_investment_reached
         ):
             fetched_balances: dict[str, float] = self.__s.get_balances()
-            if fetched_balances["quote_available"] > self.__s.amount_per_grid_plus_fee:
+            if (
+                fetched_balances["quote_available"]
+                > self.__s.amount_per_grid_plus_fee
+            ):
                 order_price: float = self.__s.get_order_price(
                     side="buy",
                     last_price=(
                         self.__s.ticker.last
                         if n_active_buy_orders == 0
-                        else min(buy_prices)
+                        else self.__s.get_lowest_buy_price()
                     ),
                 )
 
-                self.handle_arbitrage(side="buy", order_price=order_price)
-                buy_prices = list(self.__s.get_current_buy_prices())
-                LOG.debug("Length of active buy orders: %s", n_active_buy_orders + 1)
+                self.handle_arbitrage(
+                    side="buy",
+                    order_price=order_price,
+                    balances=fetched_balances,
+                )
+                LOG.debug(
+                    "Length of active buy orders: %s",
+                    n_active_buy_orders + 1,
+                )
             else:
-                LOG.warning("Not enough quote currency available to place buy order!")
+                LOG.warning(
+                    "Not enough quote currency available to place buy order!",
+                )
                 can_place_buy_order = False
 
     def __check_lowest_cancel_of_more_than_n_buy_orders(self: OrderManager) -> None:
@@ -184,16 +280,20 @@ class OrderManager:
 
         if (
             n_to_cancel := (
-                self.__s.orderbook.count(filters={"side": "buy"})
+                self.__s.orderbook.count_side(side="buy")
                 - self.__s.n_open_buy_orders
             )
         ) > 0:
-            for order in self.__s.orderbook.get_orders(
-                filters={"side": "buy"},
-                order_by=("price", "asc"),
-                limit=n_to_cancel,
-            ):
-                self.handle_cancel_order(txid=order["txid"])
+            self.__cancel_orders(
+                txids=[
+                    order["txid"]
+                    for order in self.__s.orderbook.get_orders(
+                        filters={"side": "buy"},
+                        order_by=("price", "asc"),
+                        limit=n_to_cancel,
+                    )
+                ],
+            )
 
     def __shift_buy_orders_up(self: OrderManager) -> bool:
         """
@@ -207,18 +307,12 @@ class OrderManager:
         LOG.debug("Checking if buy orders need to be shifted up...")
 
         if (
-            max_buy_order := self.__s.orderbook.get_orders(
-                filters={"side": "buy"},
-                order_by=("price", "desc"),
+            max_buy_price := self.__s.orderbook.get_prices(
+                side="buy",
                 limit=1,
-            ).first()  # type: ignore[no-untyped-call]
-        ) and (
-            self.__s.ticker.last
-            > max_buy_order["price"]
-            * (1 + self.__s.interval)
-            * (1 + self.__s.interval)
-            * 1.001
-        ):
+                descending=True,
+            )
+        ) and self.__s.ticker.last > max_buy_price[0] * self.__shift_up_factor:
             self.cancel_all_open_buy_orders()
             self.check_price_range()
             return True
@@ -234,7 +328,7 @@ class OrderManager:
             return
 
         LOG.debug("Checking if extra sell order can be placed...")
-        if self.__s.orderbook.count(filters={"side": "sell"}) == 0:
+        if self.__s.orderbook.count_side(side="sell") == 0:
             fetched_balances = self.__s.get_balances()
 
             if (
@@ -300,12 +394,16 @@ class OrderManager:
         side: str,
         order_price: float,
         txid_to_delete: str | None = None,
+        balances: dict[str, float] | None = None,
     ) -> None:
         """
         Handles the arbitrage between buy and sell orders.
 
-        The existence of this function is mainly justified due to the sleep
-        statement at the end.
+        The existence of this function is mainly justified due to the rate
+        limiting at the end.
+
+        Balances that were just fetched can be passed in order to avoid
+        fetching them again when placing a buy order.
         """
         LOG.debug(
             "Handle arbitrage for %s order with order price: %s and"
@@ -323,6 +421,7 @@ class OrderManager:
             self.new_buy_order(
                 order_price=order_price,
                 txid_to_delete=txid_to_delete,
+                balances=balances,
             )
         elif side == "sell":
             self.new_sell_order(
@@ -330,15 +429,18 @@ class OrderManager:
                 txid_to_delete=txid_to_delete,
             )
 
-        # Wait a bit to avoid rate limiting.
-        sleep(0.2)
+        # Only waits in case too many orders were placed in a short time.
+        self.__rate_limiter.acquire()
 
     def new_buy_order(
         self: OrderManager,
         order_price: float,
         txid_to_delete: str | None = None,
+        balances: dict[str, float] | None = None,
     ) -> None:
-        """Places a new buy order."""
+        """
+        Places a new buy order. The balances are fetched, if not passed.
+        """
         if self.__s.dry_run:
             LOG.info("Dry run, not placing buy order.")
             return
@@ -346,10 +448,7 @@ class OrderManager:
         if txid_to_delete is not None:
             self.__s.orderbook.remove(filters={"txid": txid_to_delete})
 
-        if (
-            self.__s.orderbook.count(filters={"side": "buy"})
-            >= self.__s.n_open_buy_orders
-        ):
+        if self.__s.orderbook.count_side(side="buy") >= self.__s.n_open_buy_orders:
             # Don't place new buy orders if there are already enough
             return
 
@@ -358,27 +457,28 @@ class OrderManager:
             return
 
         # Compute the target price for the upcoming buy order.
-        order_price = float(
-            self.__s.trade.truncate(
-                amount=order_price,
-                amount_type="price",
-                pair=self.__s.symbol,
-            ),
+        truncated_price = self.__s.truncate(
+            amount=order_price,
+            amount_type="price",
         )
+        order_price = float(truncated_price)
 
-        # Compute the target volume for the upcoming buy order.
+        # Compute the target volume for the upcoming buy order. The truncated
+        # price is used as is, as it has only a few digits, while the binary
+        # expansion of the float would be long and inexact.
         # NOTE: The fee is respected while placing the sell order
         volume = float(
-            self.__s.trade.truncate(
-                amount=Decimal(self.__s.amount_per_grid) / Decimal(order_price),
+            self.__s.truncate(
+                amount=Decimal(self.__s.amount_per_grid) / Decimal(truncated_price),
                 amount_type="volume",
-                pair=self.__s.symbol,
             ),
         )
 
         # ======================================================================
         # Check if there is enough quote balance available to place a buy order.
-        current_balances = self.__s.get_balances()
+        current_balances = (
+            balances if balances is not None else self.__s.get_balances()
+        )
         if current_balances["quote_available"] > self.__s.amount_per_grid_plus_fee:
             LOG.info(
                 "Placing order to buy %s %s @ %s %s.",
@@ -407,10 +507,12 @@ class OrderManager:
 
         # ======================================================================
         # Not enough available funds to place a buy order.
-        message = f"⚠️ {self.__s.symbol}"
-        message += f"├ Not enough {self.__s.quote_currency}"
-        message += f"├ to buy {volume} {self.__s.base_currency}"
-        message += f"└ for {order_price} {self.__s.quote_currency}"
+        message = (
+            f"⚠️ {self.__s.symbol}"
+            f"├ Not enough {self.__s.quote_currency}"
+            f"├ to buy {volume} {self.__s.base_currency}"
+            f"└ for {order_price} {self.__s.quote_currency}"
+        )
         self.__s.t.send_to_telegram(message)
         LOG.warning("Current balances: %s", current_balances)
         return
@@ -441,9 +543,7 @@ class OrderManager:
             # Add the txid of the corresponding buy order to the unsold buy
             # order txids in order to ensure that the corresponding sell order
             # will be placed - even if placing now fails.
-            if not self.__s.unsold_buy_order_txids.get(
-                filters={"txid": txid_to_delete},
-            ).first():  # type: ignore[no-untyped-call]
+            if not self.__s.unsold_buy_order_txids.exists(txid=txid_to_delete):
                 self.__s.unsold_buy_order_txids.add(
                     txid=txid_to_delete,
                     price=order_price,
@@ -456,9 +556,9 @@ class OrderManager:
             )
 
             # In some cases the corresponding buy order is not closed yet and
-            # the vol_exec is missing. In this case, the function will be
-            # called again after a short delay.
-            if (
+            # the vol_exec is missing. In this case, the order will be fetched
+            # again after a short delay.
+            while (
                 corresponding_buy_order["status"] != "closed"
                 or corresponding_buy_order["vol_exec"] == 0
             ):
@@ -467,29 +567,33 @@ class OrderManager:
                     " is not closed yet. Retry in 1 second. (order: %s)",
                     corresponding_buy_order,
                 )
-                sleep(1)
-                self.__s.om.new_sell_order(
-                    order_price=order_price,
-                    txid_to_delete=txid_to_delete,
+                if self.__stop_event.wait(timeout=1):
+                    # The sell order will be placed after restart, since the
+                    # buy order is tracked as unsold.
+                    LOG.warning(
+                        "Stopped waiting for order '%s' to be closed.",
+                        txid_to_delete,
+                    )
+                    return
+                corresponding_buy_order = self.get_orders_info_with_retry(
+                    txid=txid_to_delete,
+                    use_cache=False,
                 )
-                return
 
             if self.__s.strategy == "GridSell":
                 # Volume of a GridSell is fixed to the executed volume of the
                 # buy order.
                 volume = float(
-                    self.__s.trade.truncate(
+                    self.__s.truncate(
                         amount=float(corresponding_buy_order["vol_exec"]),
                         amount_type="volume",
-                        pair=self.__s.symbol,
                     ),
                 )
 
         order_price = float(
-            self.__s.trade.truncate(
+            self.__s.truncate(
                 amount=order_price,
                 amount_type="price",
-                pair=self.__s.symbol,
             ),
         )
 
@@ -503,11 +607,10 @@ class OrderManager:
             # Respect the fee to not reduce the quote currency over time, while
             # accumulating the base currency.
             volume = float(
-                self.__s.trade.truncate(
+                self.__s.truncate(
                     amount=Decimal(self.__s.amount_per_grid)
-                    / (Decimal(order_price) * (1 - (2 * Decimal(self.__s.fee)))),
+                    / (Decimal(order_price) * self.__s.sell_fee_factor),
                     amount_type="volume",
-                    pair=self.__s.symbol,
                 ),
             )
 
@@ -536,23 +639,27 @@ class OrderManager:
             )
 
             placed_order_txid = placed_order["txid"][0]
-            self.__s.pending_txids.add(placed_order_txid)
+            # The bookkeeping of the placed order is committed at once.
+            with self.__s.database.transaction():
+                self.__s.pending_txids.add(placed_order_txid)
 
-            if txid_to_delete is not None:
-                # Other than with buy orders, we can only delete the
-                # corresponding buy order if the sell order was placed.
-                self.__s.orderbook.remove(filters={"txid": txid_to_delete})
-                self.__s.unsold_buy_order_txids.remove(txid=txid_to_delete)
+                if txid_to_delete is not None:
+                    # Other than with buy orders, we can only delete the
+                    # corresponding buy order if the sell order was placed.
+                    self.__s.orderbook.remove(filters={"txid": txid_to_delete})
+                    self.__s.unsold_buy_order_txids.remove(txid=txid_to_delete)
 
             self.__s.om.assign_order_by_txid(txid=placed_order_txid)
             return
 
         # ======================================================================
         # Not enough funds to sell
-        message = f"⚠️ {self.__s.symbol}"
-        message += f"├ Not enough {self.__s.base_currency}"
-        message += f"├ to sell {volume} {self.__s.base_currency}"
-        message += f"└ for {order_price} {self.__s.quote_currency}"
+        message = (
+            f"⚠️ {self.__s.symbol}"
+            f"├ Not enough {self.__s.base_currency}"
+            f"├ to sell {volume} {self.__s.base_currency}"
+            f"└ for {order_price} {self.__s.quote_currency}"
+        )
 
         self.__s.t.send_to_telegram(message)
         LOG.warning("Current balances: %s", fetched_balances)
@@ -586,8 +693,10 @@ class OrderManager:
 
         It fetches the filled order info (using some tries).
 
-        If there is the KeyError which happens due to Krakens shitty, then wait
-        for one second and this function will call it self again and return.
+        If the order is not closed upstream yet, which happens due to Kraken's
+        websocket API being faster than their REST backend, it waits a few
+        seconds before fetching the order again until it is closed or the bot
+        is stopped.
         """
         LOG.debug("Handling a new filled order event for txid: %s", txid)
 
@@ -609,63 +718,87 @@ class OrderManager:
             )
             return
 
+        # ======================================================================
+        # Neither notify nor wait for the order to be closed upstream if no
+        # orders are placed anyway.
+        ##
+        if self.__s.dry_run:
+            LOG.info("Dry run, not handling filled order event.")
+            return
+
         # ======================================================================
         # Sometimes the order is not closed yet, so retry fetching the order.
         ##
         tries = 1
-        while order_details["status"] != "closed" and tries <= 3:
-            order_details = self.get_orders_info_with_retry(
-                txid=txid,
-                exit_on_fail=False,
-            )
+        while order_details["status"] != "closed":
+            if tries > 3:
+                LOG.warning(
+                    "Can not handle filled order, since the fetched order is not"
+                    " closed in upstream!"
+                    " This may happen due to Kraken's websocket API being faster"
+                    " than their REST backend. Retrying in a few seconds...",
+                )
+                tries = 1
             LOG.warning(
                 "Order '%s' is not closed! Retry %d/3 in %d seconds...",
                 txid,
                 tries,
                 (wait_time := 2 + tries),
             )
-            sleep(wait_time)
-            tries += 1
-
-        if order_details["status"] != "closed":
-            LOG.warning(
-                "Can not handle filled order, since the fetched order is not"
-                " closed in upstream!"
-                " This may happen due to Kraken's websocket API being faster"
-                " than their REST backend. Retrying in a few seconds...",
+            if self.__stop_event.wait(timeout=wait_time):
+                LOG.warning("Stopped waiting for order '%s' to be closed.", txid)
+                return
+            order_details = self.get_orders_info_with_retry(
+                txid=txid,
+                exit_on_fail=False,
+                use_cache=False,
             )
-            self.handle_filled_order_event(txid=txid)
-            return
-
-        # ======================================================================
-        if self.__s.dry_run:
-            LOG.info("Dry run, not handling filled order event.")
-            return
+            tries += 1
 
         # ======================================================================
         # Notify about the executed order
         ##
+        price = float(order_details["descr"]["price"])
         self.__s.t.send_to_telegram(
-            message=str(
-                f"✅ {self.__s.symbol}: "
-                f"{order_details['descr']['type'][0].upper()}{order_details['descr']['type'][1:]} "
-                "order executed"
-                f"\n ├ Price » {order_details['descr']['price']} {self.__s.quote_currency}"
-                f"\n ├ Size » {order_details['vol_exec']} {self.__s.base_currency}"
-                f"\n └ Size in {self.__s.quote_currency} » "
-                f"{round(float(order_details['descr']['price']) * float(order_details['vol_exec']), self.__s.cost_decimals)}",
+            message=EXECUTED_ORDER_MESSAGE.format(
+                symbol=self.__s.symbol,
+                side=order_details["descr"]["type"].capitalize(),
+                price=order_details["descr"]["price"],
+                volume=order_details["vol_exec"],
+                cost=round(
+                    price * float(order_details["vol_exec"]),
+                    self.__s.cost_decimals,
+                ),
+                quote_currency=self.__s.quote_currency,
+                base_currency=self.__s.base_currency,
             ),
         )
 
+        self.handle_closed_order(
+            txid=txid,
+            side=order_details["descr"]["type"],
+            price=price,
+        )
+
+    def handle_closed_order(
+        self: OrderManager,
+        txid: str,
+        side: str,
+        price: float,
+    ) -> None:
+        """
+        Places the corresponding order of an executed order and removes the
+        executed order from the orderbook.
+        """
         # ======================================================================
         # Create a sell order for the executed buy order.
         ##
-        if order_details["descr"]["type"] == "buy":
+        if side == "buy":
             self.handle_arbitrage(
                 side="sell",
                 order_price=self.__s.get_order_price(
                     side="sell",
-                    last_price=float(order_details["descr"]["price"]),
+                    last_price=price,
                 ),
                 txid_to_delete=txid,
             )
@@ -673,10 +806,7 @@ class OrderManager:
         # ======================================================================
         # Create a buy order for the executed sell order.
         ##
-        elif (
-            self.__s.orderbook.count(filters={"side": "sell"}, exclude={"txid": txid})
-            != 0
-        ):
+        elif self.__s.orderbook.count_side(side="sell", exclude_txid=txid) != 0:
             # A new buy order will only be placed if there is another sell
             # order, because if the last sell order was filled, the price is so
             # high, that all buy orders will be canceled anyway and new buy
@@ -685,7 +815,7 @@ class OrderManager:
                 side="buy",
                 order_price=self.__s.get_order_price(
                     side="buy",
-                    last_price=float(order_details["descr"]["price"]),
+                    last_price=price,
                 ),
                 txid_to_delete=txid,
             )
@@ -711,7 +841,7 @@ class OrderManager:
         the orderbook.
 
         """
-        if self.__s.orderbook.count(filters={"txid": txid}) == 0:
+        if not self.__s.orderbook.exists(txid=txid):
             return
 
         order_details = self.get_orders_info_with_retry(txid=txid)
@@ -736,91 +866,204 @@ class OrderManager:
                 txid,
             )
 
-        self.__s.orderbook.remove(filters={"txid": txid})
+        self.__handle_cancelled_order(txid=txid, order_details=order_details)
 
-        # Check if the order has some vol_exec to sell
-        ##
-        if float(order_details["vol_exec"]) != 0.0:
-            LOG.info(
-                "Order '%s' is partly filled - saving those funds.",
-                txid,
-            )
+    def __handle_cancelled_order(
+        self: OrderManager,
+        txid: str,
+        order_details: dict,
+    ) -> None:
+        """
+        Removes a cancelled order from the orderbook and saves its executed
+        volume - if any - in order to sell it later.
+        """
+        # Removing the order and saving its executed volume - unless it is sold
+        # right away - is committed at once.
+        with self.__s.database.transaction():
+            self.__s.orderbook.remove(filters={"txid": txid})
+
+            # Check if the order has some vol_exec to sell
+            ##
+            if not (vol_exec := float(order_details["vol_exec"])):
+                return
+
+            LOG.info("Order '%s' is partly filled - saving those funds.", txid)
             b = self.__s.configuration.get()
+            price = float(order_details["descr"]["price"])
 
             # Add vol_exec to remaining funds
             updates = {
                 "vol_of_unfilled_remaining": b["vol_of_unfilled_remaining"]
-                + float(order_details["vol_exec"]),
+                + vol_exec,
             }
 
             # Set new highest buy price.
-            if b["vol_of_unfilled_remaining_max_price"] < float(
-                order_details["descr"]["price"],
-            ):
-                updates |= {
-                    "vol_of_unfilled_remaining_max_price": float(
-                        order_details["descr"]["price"],
-                    ),
-                }
-            self.__s.configuration.update(updates)
+            if b["vol_of_unfilled_remaining_max_price"] < price:
+                updates["vol_of_unfilled_remaining_max_price"] = price
+
+            b = {**b, **updates}
 
             # Sell remaining funds if there is enough to place a sell order.
-            # Its not perfect but good enough. (Some funds may still be
-            # stuck) - but better than nothing.
-            b = self.__s.configuration.get()
+            # Its not perfect but good enough. (Some funds may still be stuck)
+            # - but better than nothing.
             if (
                 b["vol_of_unfilled_remaining"]
                 * b["vol_of_unfilled_remaining_max_price"]
-                >= self.__s.amount_per_grid
+                < self.__s.amount_per_grid
             ):
-                LOG.info(
-                    "Collected enough funds via partly filled buy orders to"
-                    " create a new sell order...",
-                )
-                self.handle_arbitrage(
+                self.__s.configuration.update(updates)
+                return
+
+        LOG.info(
+            "Collected enough funds via partly filled buy orders to create a new"
+            " sell order...",
+        )
+        try:
+            self.handle_arbitrage(
+                side="sell",
+                order_price=self.__s.get_order_price(
                     side="sell",
-                    order_price=self.__s.get_order_price(
-                        side="sell",
-                        last_price=b["vol_of_unfilled_remaining_max_price"],
-                    ),
-                )
-                self.__s.configuration.update(  # Reset the remaining funds
-                    {
-                        "vol_of_unfilled_remaining": 0,
-                        "vol_of_unfilled_remaining_max_price": 0,
-                    },
-                )
+                    last_price=b["vol_of_unfilled_remaining_max_price"],
+                ),
+            )
+        except BaseException:
+            # Save the funds, so that they are not lost in case placing the
+            # sell order fails.
+            self.__s.configuration.update(updates)
+            raise
+
+        # The collected funds are sold, so only the reset is written.
+        self.__s.configuration.update(
+            {
+                "vol_of_unfilled_remaining": 0,
+                "vol_of_unfilled_remaining_max_price": 0,
+            },
+        )
 
     def cancel_all_open_buy_orders(self: OrderManager) -> None:
         """
         Cancels all open buy orders and removes them from the orderbook.
+
+        Multiple orders are cancelled via batch requests in order to reduce the
+        number of requests.
         """
         LOG.info("Cancelling all open buy orders...")
-        for txid, order in self.__s.user.get_open_orders(
-            userref=self.__s.userref,
-        )["open"].items():
-            if (
-                order["descr"]["type"] == "buy"
-                and order["descr"]["pair"] == self.__s.altname
-            ):
+        open_buy_orders = {
+            txid: order
+            for txid, order in self.__s.user.get_open_orders(
+                userref=self.__s.userref,
+            )["open"].items()
+            if order["descr"]["type"] == "buy"
+            and order["descr"]["pair"] == self.__s.altname
+        }
+
+        if len(open_buy_orders) < 2 or self.__s.dry_run:
+            for txid in open_buy_orders:
                 self.handle_cancel_order(txid=txid)
-                sleep(0.2)  # Avoid rate limiting
+                self.__rate_limiter.acquire()
+        else:
+            cancelled_txids = self.__cancel_order_batch(
+                txids=[
+                    txid
+                    for txid, order in open_buy_orders.items()
+                    if self.__s.orderbook.exists(txid=txid)
+                    and order["userref"] == self.__s.userref
+                ],
+            )
+
+            # The open orders may have been (partly) filled until they were
+            # cancelled, so their final details are required.
+            orders = self.get_orders_info_bulk(txids=cancelled_txids)
+            for txid in cancelled_txids:
+                self.__handle_cancelled_order(
+                    txid=txid,
+                    order_details=orders[txid],
+                )
 
         self.__s.orderbook.remove(filters={"side": "buy"})
 
+    def __cancel_orders(self: OrderManager, txids: list[str]) -> None:
+        """
+        Cancels multiple orders of the local orderbook just like
+        ``handle_cancel_order``, but fetches their details and cancels them via
+        batch requests in order to reduce the number of requests.
+        """
+        if len(txids) < 2 or self.__s.dry_run:
+            for txid in txids:
+                self.handle_cancel_order(txid=txid)
+            return
+
+        orders = self.get_orders_info_bulk(
+            txids=[txid for txid in txids if self.__s.orderbook.exists(txid=txid)],
+        )
+        cancelled_txids = self.__cancel_order_batch(
+            txids=[
+                txid
+                for txid, order in orders.items()
+                if order["descr"]["pair"] == self.__s.altname
+                and order["userref"] == self.__s.userref
+            ],
+        )
+
+        # The orders may have been (partly) filled until they were cancelled, so
+        # their final details are required for saving the executed volume.
+        orders = self.get_orders_info_bulk(txids=cancelled_txids)
+        for txid in cancelled_txids:
+            self.__handle_cancelled_order(txid=txid, order_details=orders[txid])
+
+    def __cancel_order_batch(self: OrderManager, txids: list[str]) -> list[str]:
+        """
+        Cancels orders via as few batch requests as possible.
+
+        If a batch fails, e.g. because one of its orders was closed in the
+        meantime, its orders are cancelled and handled individually via
+        ``handle_cancel_order``. Returns the txids of the orders that were
+        cancelled via batch requests and still need to be handled.
+        """
+        cancelled_txids: list[str] = []
+        for i in range(0, len(txids), MAX_ORDERS_PER_CANCEL_BATCH):
+            LOG.info(
+                "Cancelling orders: %s",
+                (batch := txids[i : i + MAX_ORDERS_PER_CANCEL_BATCH]),
+            )
+            try:
+                self.__s.trade.cancel_order_batch(
+                    orders=cast("list[str | int]", batch),
+                )
+            except KrakenUnknownOrderError:
+                LOG.info(
+                    "Failed to cancel orders via batch request, cancelling them"
+                    " individually...",
+                )
+                for txid in batch:
+                    self.handle_cancel_order(txid=txid)
+                    self.__rate_limiter.acquire()
+            else:
+                cancelled_txids.extend(batch)
+        return cancelled_txids
+
     def get_orders_info_with_retry(
         self: OrderManager,
         txid: str,
         tries: int = 0,
         max_tries: int = 5,
         exit_on_fail: bool = True,
+        use_cache: bool = True,
     ) -> dict | None:
         """
         Returns the order details for a given txid.
 
         NOTE: We need retry here, since Kraken lacks of fast processing of
               placed/filled orders and making them available via REST API.
+
+        Details of finalized orders are served from memory if available, unless
+        ``use_cache`` is False, e.g. when waiting for an order to be updated
+        upstream.
         """
+        if use_cache and (cached_order := self.__order_info_cache.get(txid)):
+            self.__order_info_cache.move_to_end(txid)
+            return cached_order
+
         while tries < max_tries and not (
             order_details := self.__s.user.get_orders_info(
                 txid=txid,
@@ -848,4 +1091,52 @@ class OrderManager:
             )
 
         order_details["txid"] = txid
+        self.__cache_order_info(txid=txid, order_details=order_details)
         return order_details  # type: ignore[no-any-return]
+
+    def __cache_order_info(self: OrderManager, txid: str, order_details: dict) -> None:
+        """Keep the details of an order in memory if it is finalized."""
+        if order_details.get("status") not in FINAL_ORDER_STATES:
+            return
+        self.__order_info_cache[txid] = order_details
+        self.__order_info_cache.move_to_end(txid)
+        if len(self.__order_info_cache) > ORDER_INFO_CACHE_SIZE:
+            self.__order_info_cache.popitem(last=False)
+
+    def get_orders_info_bulk(
+        self: OrderManager,
+        txids: list[str],
+    ) -> dict[str, dict]:
+        """
+        Returns the order details for multiple txids.
+
+        Kraken allows querying up to 50 orders at once, so the txids are
+        requested in chunks to reduce the number of requests. Orders that are
+        not (yet) available in the response are fetched individually using
+        ``get_orders_info_with_retry``. This also applies to all orders of a
+        chunk whose request failed, e.g. due to a network error or a single
+        invalid txid.
+        """
+        orders: dict[str, dict] = {}
+        for i in range(0, len(txids), MAX_TXIDS_PER_QUERY):
+            try:
+                orders |= self.__s.user.get_orders_info(
+                    txid=(chunk := txids[i : i + MAX_TXIDS_PER_QUERY]),
+                )
+            except (
+                Exception  # pylint: disable=broad-exception-caught # noqa: BLE001
+            ) as exc:
+                LOG.warning(
+                    "Failed to query %d orders at once, querying them"
+                    " individually: %s",
+                    len(chunk),
+                    exc,
+                )
+
+        for txid in txids:
+            if txid in orders:
+                orders[txid]["txid"] = txid
+                self.__cache_order_info(txid=txid, order_details=orders[txid])
+            else:
+                orders[txid] = self.get_orders_info_with_retry(txid=txid)
+        return orders
@@ -15,11 +15,13 @@ algorithm for live trading.
 from __future__ import annotations
 
 import traceback
+from decimal import Decimal
 from logging import getLogger
 from typing import TYPE_CHECKING, Self
 
 from kraken_infinity_grid.exceptions import GridBotStateError
 from kraken_infinity_grid.state_machine import States
+from kraken_infinity_grid.telegram import EXECUTED_ORDER_MESSAGE
 
 if TYPE_CHECKING:
     from kraken_infinity_grid.gridbot import KrakenInfinityGridBot
@@ -34,18 +36,18 @@ class SetupManager:
         LOG.debug("Initializing SetupManager...")
         self.__s = strategy
 
-    def __update_orderbook_get_open_orders(self: SetupManager) -> tuple[list, list]:
-        """Get the open orders and txid as lists."""
+    def __update_orderbook_get_open_orders(self: SetupManager) -> tuple[list, set]:
+        """Get the open orders as list and their txids as set."""
         LOG.info("  - Retrieving open orders from upstream...")
 
-        open_orders, open_txids = [], []
+        open_orders, open_txids = [], set()
         for txid, order in self.__s.user.get_open_orders(
             userref=self.__s.userref,
         )["open"].items():
             if order["descr"]["pair"] == self.__s.altname:
                 order["txid"] = txid  # IMPORTANT
                 open_orders.append(order)
-                open_txids.append(order["txid"])
+                open_txids.add(order["txid"])
         return open_orders, open_txids
 
     def __update_order_book_handle_closed_order(
@@ -63,53 +65,25 @@ class SetupManager:
         LOG.info("Handling executed order: %s", closed_order["txid"])
         closed_order["side"] = closed_order["descr"]["type"]
 
-        message = str(
-            f"✅ {self.__s.symbol}: {closed_order['side'][0].upper()}{closed_order['side'][1:]} "
-            "order executed"
-            f"\n ├ Price » {closed_order['price']} {self.__s.quote_currency}"
-            f"\n ├ Size » {closed_order['vol_exec']} {self.__s.base_currency}"
-            f"\n └ Size in {self.__s.quote_currency} » "
-            f"{float(closed_order['price']) * float(closed_order['vol_exec'])}",
+        self.__s.t.send_to_telegram(
+            EXECUTED_ORDER_MESSAGE.format(
+                symbol=self.__s.symbol,
+                side=closed_order["side"].capitalize(),
+                price=closed_order["price"],
+                volume=closed_order["vol_exec"],
+                cost=float(closed_order["price"]) * float(closed_order["vol_exec"]),
+                quote_currency=self.__s.quote_currency,
+                base_currency=self.__s.base_currency,
+            ),
         )
 
-        self.__s.t.send_to_telegram(message)
-
-        # ======================================================================
-        # If a buy order was filled, the sell order needs to be placed.
-        if closed_order["side"] == "buy":
-            self.__s.om.handle_arbitrage(
-                side="sell",
-                order_price=self.__s.get_order_price(
-                    side="sell",
-                    last_price=float(closed_order["price"]),
-                ),
-                txid_to_delete=closed_order["txid"],
-            )
-
         # ======================================================================
-        # If a sell order was filled, we may need to place a new buy order.
-        elif closed_order["side"] == "sell":
-            # A new buy order will only be placed if there is another sell
-            # order, because if the last sell order was filled, the price is so
-            # high, that all buy orders will be canceled anyway and new buy
-            # orders will be placed in ``check_price_range`` during shift-up.
-            if (
-                self.__s.orderbook.count(
-                    filters={"side": "sell"},
-                    exclude={"txid": closed_order["txid"]},
-                )
-                != 0
-            ):
-                self.__s.om.handle_arbitrage(
-                    side="buy",
-                    order_price=self.__s.get_order_price(
-                        side="buy",
-                        last_price=float(closed_order["price"]),
-                    ),
-                    txid_to_delete=closed_order["txid"],
-                )
-            else:
-                self.__s.orderbook.remove(filters={"txid": closed_order["txid"]})
+        # Place the corresponding order of the executed order.
+        self.__s.om.handle_closed_order(
+            txid=closed_order["txid"],
+            side=closed_order["side"],
+            price=float(closed_order["price"]),
+        )
 
     def __update_order_book(self: SetupManager) -> None:
         """
@@ -134,7 +108,11 @@ class SetupManager:
         # Orders of the upstream which are not yet tracked in the local
         # orderbook will now be added to the local orderbook.
         ##
-        local_txids = [order["txid"] for order in self.__s.orderbook.get_orders()]
+        # The local orderbook is only read once, as a mapping in order to keep
+        # the order of the rows while allowing fast lookups.
+        local_txids = dict.fromkeys(
+            order["txid"] for order in self.__s.orderbook.get_orders()
+        )
         something_changed = False
         for order in open_orders:
             if order["txid"] not in local_txids:
@@ -152,27 +130,27 @@ class SetupManager:
         # If they got filled -> place new orders.
         # If canceled -> remove from local orderbook.
         ##
-        for order in self.__s.orderbook.get_orders():
-            if order["txid"] not in open_txids:
-                closed_order = self.__s.om.get_orders_info_with_retry(
-                    txid=order["txid"],
+        # The details of all orders that are not open anymore are fetched at
+        # once in order to reduce the number of requests. Orders that were just
+        # added are open, so only the previously tracked orders are checked.
+        ##
+        missing_txids = [txid for txid in local_txids if txid not in open_txids]
+        for txid, closed_order in self.__s.om.get_orders_info_bulk(
+            txids=missing_txids,
+        ).items():
+            # ==================================================================
+            # Order was filled
+            if closed_order["status"] == "closed":
+                self.__update_order_book_handle_closed_order(
+                    closed_order=closed_order,
                 )
-                # ==============================================================
-                # Order was filled
-                if closed_order["status"] == "closed":
-                    self.__update_order_book_handle_closed_order(
-                        closed_order=closed_order,
-                    )
-
-                # ==============================================================
-                # Order was closed
-                elif closed_order["status"] in {"canceled", "expired"}:
-                    self.__s.orderbook.remove(filters={"txid": order["txid"]})
-
-                else:
-                    # pending || open order - still active
-                    ##
-                    continue
+
+            # ==================================================================
+            # Order was closed
+            elif closed_order["status"] in {"canceled", "expired"}:
+                self.__s.orderbook.remove(filters={"txid": txid})
+
+            # else: pending || open order - still active
 
         # There are no more filled/closed and cancelled orders in the local
         # orderbook and all upstream orders are tracked locally.
@@ -193,6 +171,10 @@ class SetupManager:
         self.__s.zbase_currency = data["base"]  # XXBT
         self.__s.xquote_currency = data["quote"]  # ZEUR
         self.__s.cost_decimals = data["cost_decimals"]  # 5, i.e., 0.00001 EUR
+        self.__s.pair_decimals = int(data["pair_decimals"])  # 1, i.e., 0.1 EUR
+        self.__s.lot_decimals = int(data["lot_decimals"])  # 8, i.e., 1e-8 BTC
+        self.__s.ordermin = Decimal(data["ordermin"])
+        self.__s.costmin = Decimal(data["costmin"])
 
         if self.__s.fee is None:
             # This is the case if the '--fee' parameter was not passed, then we
@@ -202,6 +184,7 @@ class SetupManager:
         self.__s.amount_per_grid_plus_fee = self.__s.amount_per_grid * (
             1 + self.__s.fee
         )
+        self.__s.sell_fee_factor = 1 - (2 * Decimal(self.__s.fee))
 
     def __check_configuration_changes(self: Self) -> None:
         """
@@ -211,19 +194,19 @@ class SetupManager:
         all open buy orders to be cancelled.
         """
         LOG.info("- Checking configuration changes...")
-        cancel_all_orders = False
+        configuration = self.__s.configuration.get()
+        changes = {}
 
-        if self.__s.amount_per_grid != self.__s.configuration.get()["amount_per_grid"]:
+        if self.__s.amount_per_grid != configuration["amount_per_grid"]:
             LOG.info(" - Amount per grid changed => cancel open buy orders soon...")
-            self.__s.configuration.update({"amount_per_grid": self.__s.amount_per_grid})
-            cancel_all_orders = True
+            changes["amount_per_grid"] = self.__s.amount_per_grid
 
-        if self.__s.interval != self.__s.configuration.get()["interval"]:
+        if self.__s.interval != configuration["interval"]:
             LOG.info(" - Interval changed => cancel open buy orders soon...")
-            self.__s.configuration.update({"interval": self.__s.interval})
-            cancel_all_orders = True
+            changes["interval"] = self.__s.interval
 
-        if cancel_all_orders:
+        if changes:
+            self.__s.configuration.update(changes)
             self.__s.om.cancel_all_open_buy_orders()
 
         LOG.info("- Configuration checked and up-to-date!")
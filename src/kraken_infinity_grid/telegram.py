@@ -7,6 +7,8 @@
 
 from datetime import datetime
 from logging import getLogger
+from queue import SimpleQueue
+from threading import Lock, Thread
 from typing import TYPE_CHECKING, Self
 
 import requests
@@ -17,9 +19,50 @@ if TYPE_CHECKING:
 
 LOG = getLogger(__name__)
 
+#: Template of the notification about an executed order.
+EXECUTED_ORDER_MESSAGE: str = (
+    "✅ {symbol}: {side} order executed"
+    "\n ├ Price » {price} {quote_currency}"
+    "\n ├ Size » {volume} {base_currency}"
+    "\n └ Size in {quote_currency} » {cost}"
+)
+
+#: Template of the static part of the status update.
+STATUS_UPDATE_MESSAGE: str = (
+    "👑 {symbol}"
+    "\n└ Price » {last_price} {quote_currency}"
+    "\n"
+    "\n⚜️ Account"
+    "\n├ Total {base_currency} » {base_balance}"
+    "\n├ Total {quote_currency} » {quote_balance}"
+    "\n├ Available {quote_currency} » {quote_available}"
+    "\n├ Available {base_currency} » {base_available}"
+    "\n├ Unfilled surplus of {base_currency} » {vol_of_unfilled_remaining}"
+    "\n├ Wealth » {wealth} {quote_currency}"
+    "\n└ Investment » {investment} / {max_investment} {quote_currency}"
+    "\n"
+    "\n💠 Orders"
+    "\n├ Amount per Grid » {amount_per_grid} {quote_currency}"
+    "\n└ Open orders » {n_open_orders}"
+    "\n"
+    "\n```"
+    "\n 🏷️ Price in {quote_currency}"
+)
+
+#: Placeholder within the queue for the latest pending status update.
+_STATUS_UPDATE: object = object()
+
 
 class Telegram:
-    """Telegram class to send messages to a Telegram chat."""
+    """
+    Telegram class to send messages to a Telegram chat.
+
+    Regular messages are queued and sent by a background thread, so that the
+    trading logic is not blocked by the requests to the Telegram API.
+    Exception messages are sent immediately using a separate session, as they
+    usually precede the termination of the algorithm. Status updates are
+    conflated, i.e., only the most recent one is sent if several are pending.
+    """
 
     def __init__(
         self: Self,
@@ -34,42 +77,108 @@ class Telegram:
         self.__telegram_chat_id = telegram_chat_id
         self.__exception_token = exception_token
         self.__exception_chat_id = exception_chat_id
+        self.__queue: SimpleQueue[str | object | None] = SimpleQueue()
+        self.__notifier: Thread | None = None
+        self.__notifier_lock = Lock()
+        self.__pending_status_update: str | None = None
+        self.__pending_lock = Lock()
+        # Reuse the connection to the Telegram API across messages. Sessions
+        # are not thread-safe, so this one is only used by the notifier thread.
+        self.__session = requests.Session()
 
     def send_to_telegram(
         self: Self,
         message: str,
         exception: bool | None = False,
         log: bool = True,
+        status_update: bool = False,
     ) -> None:
-        """Send a message to a Telegram chat"""
+        """
+        Send a message to a Telegram chat
+
+        If ``status_update`` is set, a pending status update that was not sent
+        yet is replaced by the passed message.
+        """
         if exception:
             if log:
                 LOG.error(message)
             if not (self.__exception_token and self.__exception_chat_id):
                 return
-            response = requests.post(
-                url=f"https://api.telegram.org/bot{self.__exception_token}/sendMessage",
-                params={
-                    "chat_id": self.__exception_chat_id,
-                    "text": f"```\n{message}\n```",
-                    "parse_mode": "markdown",
-                },
-                timeout=10,
-            )
+            with requests.Session() as session:
+                self.__post(
+                    session=session,
+                    token=self.__exception_token,
+                    chat_id=self.__exception_chat_id,
+                    text=f"```\n{message}\n```",
+                )
         else:
             if log:
                 LOG.info(message)
             if not (self.__telegram_token and self.__telegram_chat_id):
                 return
-            response = requests.post(
-                url=f"https://api.telegram.org/bot{self.__telegram_token}/sendMessage",
-                params={
-                    "chat_id": self.__telegram_chat_id,
-                    "text": message,
-                    "parse_mode": "markdown",
-                },
-                timeout=10,
-            )
+            with self.__notifier_lock:
+                if self.__notifier is None:
+                    self.__notifier = Thread(
+                        target=self.__process_queue,
+                        name="telegram-notifier",
+                        daemon=True,
+                    )
+                    self.__notifier.start()
+
+            if status_update:
+                with self.__pending_lock:
+                    is_pending = self.__pending_status_update is not None
+                    self.__pending_status_update = message
+                if is_pending:
+                    return
+                self.__queue.put_nowait(_STATUS_UPDATE)
+            else:
+                self.__queue.put_nowait(message)
+
+    def close(self: Self) -> None:
+        """Send all queued messages and stop the notifier thread."""
+        with self.__notifier_lock:
+            if self.__notifier is not None:
+                self.__queue.put_nowait(None)
+                self.__notifier.join()
+                self.__notifier = None
+
+    def __process_queue(self: Self) -> None:
+        """Send the queued messages until ``None`` is received."""
+        while (message := self.__queue.get()) is not None:
+            if message is _STATUS_UPDATE:
+                with self.__pending_lock:
+                    message, self.__pending_status_update = (
+                        self.__pending_status_update,
+                        None,
+                    )
+            try:
+                self.__post(
+                    session=self.__session,
+                    token=self.__telegram_token,
+                    chat_id=self.__telegram_chat_id,
+                    text=str(message),
+                )
+            except requests.exceptions.RequestException as exc:
+                LOG.error("Failed to send message to Telegram: %s", exc)
+
+    def __post(
+        self: Self,
+        session: requests.Session,
+        token: str,
+        chat_id: str,
+        text: str,
+    ) -> None:
+        """Post a message to the Telegram API."""
+        response = session.post(
+            url=f"https://api.telegram.org/bot{token}/sendMessage",
+            params={
+                "chat_id": chat_id,
+                "text": text,
+                "parse_mode": "markdown",
+            },
+            timeout=10,
+        )
 
         if response.status_code != 200:
             # Its not that important to send telegram messages... so we just log
@@ -78,72 +187,78 @@ class Telegram:
             LOG.error(
                 "Failed to send message to Telegram. Status code: %d, message: \n%s",
                 response.status_code,
-                message,
+                text,
             )
 
     def send_telegram_update(self: Self) -> None:
         """Send a message to the Telegram chat with the current status."""
         balances = self.__s.get_balances()
+        last_price = self.__s.ticker.last
+        vol_of_unfilled_remaining = self.__s.configuration.get()[
+            "vol_of_unfilled_remaining"
+        ]
 
-        message = f"👑 {self.__s.symbol}\n"
-        message += f"└ Price » {self.__s.ticker.last} {self.__s.quote_currency}\n\n"
-
-        message += "⚜️ Account\n"
-        message += f"├ Total {self.__s.base_currency} » {balances['base_balance']}\n"
-        message += f"├ Total {self.__s.quote_currency} » {balances['quote_balance']}\n"
-        message += (
-            f"├ Available {self.__s.quote_currency} » {balances['quote_available']}\n"
-        )
-        message += f"├ Available {self.__s.base_currency} » {balances['base_available'] - float(self.__s.configuration.get()['vol_of_unfilled_remaining'])}\n"  # noqa: E501
-        message += f"├ Unfilled surplus of {self.__s.base_currency} » {self.__s.configuration.get()['vol_of_unfilled_remaining']}\n"  # noqa: E501
-        message += f"├ Wealth » {round(balances['base_balance'] * self.__s.ticker.last + balances['quote_balance'], self.__s.cost_decimals)} {self.__s.quote_currency}\n"  # noqa: E501
-        message += f"└ Investment » {round(self.__s.investment, self.__s.cost_decimals)} / {self.__s.max_investment} {self.__s.quote_currency}\n\n"  # noqa: E501
-
-        message += "💠 Orders\n"
-        message += f"├ Amount per Grid » {self.__s.amount_per_grid} {self.__s.quote_currency}\n"
-        message += f"└ Open orders » {self.__s.orderbook.count()}\n"
-
-        message += "\n```\n"
-        message += f" 🏷️ Price in {self.__s.quote_currency}\n"
+        lines = [
+            STATUS_UPDATE_MESSAGE.format(
+                symbol=self.__s.symbol,
+                last_price=last_price,
+                quote_currency=self.__s.quote_currency,
+                base_currency=self.__s.base_currency,
+                base_balance=balances["base_balance"],
+                quote_balance=balances["quote_balance"],
+                quote_available=balances["quote_available"],
+                base_available=balances["base_available"]
+                - float(vol_of_unfilled_remaining),
+                vol_of_unfilled_remaining=vol_of_unfilled_remaining,
+                wealth=round(
+                    balances["base_balance"] * last_price + balances["quote_balance"],
+                    self.__s.cost_decimals,
+                ),
+                investment=round(self.__s.investment, self.__s.cost_decimals),
+                max_investment=self.__s.max_investment,
+                amount_per_grid=self.__s.amount_per_grid,
+                n_open_orders=self.__s.orderbook.count(),
+            ),
+        ]
         max_orders_to_list: int = 5
 
-        next_sells = [
-            order["price"]
-            for order in self.__s.orderbook.get_orders(
-                filters={"side": "sell"},
-                order_by=("price", "ASC"),
-                limit=max_orders_to_list,
-            )
-        ]
+        next_sells = self.__s.orderbook.get_prices(
+            side="sell",
+            limit=max_orders_to_list,
+        )
         next_sells.reverse()
 
-        if (n_sells := len(next_sells)) == 0:
-            message += f"└───┬> {self.__s.ticker.last}\n"
+        if len(next_sells) == 0:
+            lines.append(f"└───┬> {last_price}")
         else:
-            for index, sell_price in enumerate(next_sells):
-                change = (sell_price / self.__s.ticker.last - 1) * 100
-                if index == 0:
-                    message += f" │  ┌[ {sell_price} (+{change:.2f}%)\n"
-                elif index <= n_sells - 1 and index != max_orders_to_list:
-                    message += f" │  ├[ {sell_price} (+{change:.2f}%)\n"
-            message += f" └──┼> {self.__s.ticker.last}\n"
-
-        next_buys = [
-            order["price"]
-            for order in self.__s.orderbook.get_orders(
-                filters={"side": "buy"},
-                order_by=("price", "DESC"),
-                limit=max_orders_to_list,
+            lines.extend(
+                f" │  {prefix}[ {price} (+{(price / last_price - 1) * 100:.2f}%)"
+                for prefix, price in zip(
+                    ("┌", *("├",) * (len(next_sells) - 1)),
+                    next_sells,
+                    strict=True,
+                )
             )
-        ]
-        if (n_buys := len(next_buys)) != 0:
-            for index, buy_price in enumerate(next_buys):
-                change = (buy_price / self.__s.ticker.last - 1) * 100
-                if index < n_buys - 1 and index != max_orders_to_list:
-                    message += f"    ├[ {buy_price} ({change:.2f}%)\n"
-                else:
-                    message += f"    └[ {buy_price} ({change:.2f}%)"
-        message += "\n```"
-
-        self.send_to_telegram(message)
+            lines.append(f" └──┼> {last_price}")
+
+        next_buys = self.__s.orderbook.get_prices(
+            side="buy",
+            limit=max_orders_to_list,
+            descending=True,
+        )
+        lines.extend(
+            f"    {prefix}[ {price} ({(price / last_price - 1) * 100:.2f}%)"
+            for prefix, price in zip(
+                (*("├",) * (len(next_buys) - 1), "└"),
+                next_buys,
+                strict=False,
+            )
+        )
+        if len(next_buys) == 0:
+            # Keep the blank line before the closing fence.
+            lines.append("")
+        lines.append("```")
+
+        message = "\n".join(lines)
+        self.send_to_telegram(message, status_update=True)
         self.__s.configuration.update({"last_telegram_update": datetime.now()})
@@ -8,6 +8,7 @@
 import logging
 from unittest import mock
 
+import pytest
 import pytest_asyncio
 from kraken.spot import Market
 
@@ -16,8 +17,30 @@ from kraken_infinity_grid.gridbot import KrakenInfinityGridBot
 from .helper import KrakenAPI
 
 
+@pytest.fixture
+def db_config() -> dict:
+    """
+    Fixture to create an in-memory database configuration, as the integration
+    tests don't need to persist anything across bot instances.
+    """
+    return {"in_memory": True}
+
+
+@pytest.fixture(params=[True, False], ids=["batched", "sequential"])
+def batch_executions(request: pytest.FixtureRequest) -> bool:
+    """
+    Fixture to run the integration tests with the fills of a ticker update
+    being reported in a single as well as in individual executions messages.
+    """
+    return request.param  # type: ignore[no-any-return]
+
+
 @pytest_asyncio.fixture
-async def instance(config: dict, db_config: dict) -> KrakenInfinityGridBot:
+async def instance(
+    config: dict,
+    db_config: dict,
+    batch_executions: bool,
+) -> KrakenInfinityGridBot:
     """Fixture to create a KrakenInfinityGridBot instance for testing."""
     instance = KrakenInfinityGridBot(
         key="key",
@@ -33,7 +56,7 @@ async def instance(config: dict, db_config: dict) -> KrakenInfinityGridBot:
     )
 
     # Mock the Kraken clients as we're not interacting with the Kraken API
-    api = KrakenAPI()
+    api = KrakenAPI(batch_executions=batch_executions)
     instance.user = api
     instance.market = mock.MagicMock(spec=Market)
     instance.trade = api
@@ -57,6 +80,10 @@ async def instance(config: dict, db_config: dict) -> KrakenInfinityGridBot:
             "base": "XXBT",
             "quote": "ZUSD",
             "cost_decimals": 5,
+            "pair_decimals": 1,
+            "lot_decimals": 8,
+            "ordermin": "0.00005",
+            "costmin": "0.5",
         },
     }
     yield instance
@@ -9,121 +9,139 @@
 """ Helper data structures used for integration testing. """
 
 import uuid
+from dataclasses import dataclass
+from decimal import Decimal
 from typing import Any, Callable, Self
 
 from kraken.spot import Trade, User
 
 
+@dataclass(slots=True)
+class MockOrder:
+    """Internal representation of an order placed via the mocked API."""
+
+    userref: int
+    side: str
+    ordertype: str
+    price: Decimal
+    vol: Decimal
+    vol_exec: Decimal = Decimal(0)
+    cost: Decimal = Decimal(0)
+    fee: Decimal = Decimal(0)
+    status: str = "open"
+
+    def to_dict(self: Self) -> dict:
+        """Return the order as it would be returned by the Kraken API."""
+        return {
+            "userref": self.userref,
+            "descr": {
+                "pair": "BTCUSD",
+                "type": self.side,
+                "ordertype": self.ordertype,
+                "price": float(self.price),
+            },
+            "status": self.status,
+            "vol": float(self.vol),
+            "vol_exec": str(self.vol_exec),
+            "cost": str(self.cost),
+            "fee": str(self.fee),
+        }
+
+
 class KrakenAPI(Trade, User):
     """
     Class mocking the User and Trade client of the python-kraken-sdk to
     simulate real trading.
 
-    TODOs:
-
-    - [ ] Properly handle updating the user's current balances.
+    If ``batch_executions`` is set, all orders filled by a ticker update are
+    reported in a single executions message. Otherwise, each order is filled
+    and reported one after another.
     """
 
-    def __init__(self: Self) -> None:
+    def __init__(self: Self, batch_executions: bool = True) -> None:
         super().__init__()  # DONT PASS SECRETS!
-        self.__orders = {}
+        self.__batch_executions = batch_executions
+        # Orders and balances are kept as Decimals to avoid float artifacts and
+        # are only converted into the representation of the Kraken API when
+        # being returned.
+        self.__orders: dict[str, MockOrder] = {}
+        # Subset of the orders that are open, e.g. to avoid scanning all orders
+        # on every ticker update.
+        self.__open_orders: dict[str, MockOrder] = {}
         self.__balances = {
-            "XXBT": {"balance": "100.0", "hold_trade": "0.0"},
-            "ZUSD": {"balance": "1000000.0", "hold_trade": "0.0"},
+            "XXBT": {"balance": Decimal("100.0"), "hold_trade": Decimal("0.0")},
+            "ZUSD": {"balance": Decimal("1000000.0"), "hold_trade": Decimal("0.0")},
         }
-        self.__fee = 0.0025
+        # The balance entries of the traded assets are updated in place.
+        self.__xxbt = self.__balances["XXBT"]
+        self.__zusd = self.__balances["ZUSD"]
+        self.__fee = Decimal("0.0025")
 
     def create_order(self: Self, **kwargs) -> dict:  # noqa: ANN003
         """Create a new order and update balances if needed."""
-        txid = str(uuid.uuid4()).upper()
-        order = {
-            "userref": kwargs["userref"],
-            "descr": {
-                "pair": "BTCUSD",
-                "type": kwargs["side"],
-                "ordertype": kwargs["ordertype"],
-                "price": kwargs["price"],
-            },
-            "status": "open",
-            "vol": kwargs["volume"],
-            "vol_exec": "0.0",
-            "cost": "0.0",
-            "fee": "0.0",
-        }
+        txid = uuid.uuid4().hex.upper()
+        price = Decimal(str(kwargs["price"]))
+        volume = Decimal(str(kwargs["volume"]))
+        order = MockOrder(
+            userref=kwargs["userref"],
+            side=kwargs["side"],
+            ordertype=kwargs["ordertype"],
+            price=price,
+            vol=volume,
+        )
 
         if kwargs["side"] == "buy":
-            required_balance = float(kwargs["price"]) * float(kwargs["volume"])
-            if float(self.__balances["ZUSD"]["balance"]) < required_balance:
+            required_balance = price * volume
+            if self.__zusd["balance"] < required_balance:
                 raise ValueError("Insufficient balance to create buy order")
-            self.__balances["ZUSD"]["balance"] = str(
-                float(self.__balances["ZUSD"]["balance"]) - required_balance,
-            )
-            self.__balances["ZUSD"]["hold_trade"] = str(
-                float(self.__balances["ZUSD"]["hold_trade"]) + required_balance,
-            )
+            self.__zusd["balance"] -= required_balance
+            self.__zusd["hold_trade"] += required_balance
         elif kwargs["side"] == "sell":
-            if float(self.__balances["XXBT"]["balance"]) < float(kwargs["volume"]):
+            if self.__xxbt["balance"] < volume:
                 raise ValueError("Insufficient balance to create sell order")
-            self.__balances["XXBT"]["balance"] = str(
-                float(self.__balances["XXBT"]["balance"]) - float(kwargs["volume"]),
-            )
-            self.__balances["XXBT"]["hold_trade"] = str(
-                float(self.__balances["XXBT"]["hold_trade"]) + float(kwargs["volume"]),
-            )
+            self.__xxbt["balance"] -= volume
+            self.__xxbt["hold_trade"] += volume
 
         self.__orders[txid] = order
+        self.__open_orders[txid] = order
         return {"txid": [txid]}
 
     def fill_order(self: Self, txid: str, volume: float | None = None) -> None:
         """Fill an order and update balances."""
-        order = self.__orders.get(txid, {})
-        if not order:
+        if (order := self.__orders.get(txid)) is None:
             return
 
-        if volume is None:
-            volume = float(order["vol"])
+        vol = order.vol
+        vol_exec = order.vol_exec
+        volume = vol if volume is None else Decimal(str(volume))
 
-        if volume > float(order["vol"]) - float(order["vol_exec"]):
+        if volume > vol - vol_exec:
             raise ValueError(
                 "Cannot fill order with volume higher than remaining order volume",
             )
 
-        executed_volume = float(order["vol_exec"]) + volume
-        remaining_volume = float(order["vol"]) - executed_volume
+        executed_volume = vol_exec + volume
+        fee = vol_exec * self.__fee
+        cost = executed_volume * order.price + fee
 
-        order["fee"] = str(float(order["vol_exec"]) * self.__fee)
-        order["vol_exec"] = str(executed_volume)
-        order["cost"] = str(
-            executed_volume * float(order["descr"]["price"]) + float(order["fee"]),
-        )
-
-        if remaining_volume <= 0:
-            order["status"] = "closed"
+        order.fee = fee
+        order.vol_exec = executed_volume
+        order.cost = cost
+        if vol - executed_volume <= 0:
+            order.status = "closed"
+            self.__open_orders.pop(txid, None)
         else:
-            order["status"] = "open"
-
-        self.__orders[txid] = order
-
-        if order["descr"]["type"] == "buy":
-            self.__balances["XXBT"]["balance"] = str(
-                float(self.__balances["XXBT"]["balance"]) + volume,
-            )
-            self.__balances["ZUSD"]["balance"] = str(
-                float(self.__balances["ZUSD"]["balance"]) - float(order["cost"]),
-            )
-            self.__balances["ZUSD"]["hold_trade"] = str(
-                float(self.__balances["ZUSD"]["hold_trade"]) - float(order["cost"]),
-            )
-        elif order["descr"]["type"] == "sell":
-            self.__balances["XXBT"]["balance"] = str(
-                float(self.__balances["XXBT"]["balance"]) - volume,
-            )
-            self.__balances["XXBT"]["hold_trade"] = str(
-                float(self.__balances["XXBT"]["hold_trade"]) - volume,
-            )
-            self.__balances["ZUSD"]["balance"] = str(
-                float(self.__balances["ZUSD"]["balance"]) + float(order["cost"]),
-            )
+            order.status = "open"
+            self.__open_orders[txid] = order
+
+        if order.side == "buy":
+            self.__xxbt["balance"] += volume
+            self.__zusd["balance"] -= cost
+            self.__zusd["hold_trade"] -= cost
+        elif order.side == "sell":
+            self.__xxbt["balance"] -= volume
+            self.__xxbt["hold_trade"] -= volume
+            self.__zusd["balance"] += cost
 
     async def on_ticker_update(self: Self, callback: Callable, last: float) -> None:
         """Update the ticker and fill orders if needed."""
@@ -133,79 +151,97 @@ class KrakenAPI(Trade, User):
                 "data": [{"symbol": "BTC/USD", "last": last}],
             },
         )
+        if not self.__open_orders:
+            return
 
-        async def fill_order(txid: str) -> None:
-            self.fill_order(txid)
+        # Iterate over a snapshot of the internal orders, since filling them
+        # changes the open orders. Prices are stored as numbers, so they don't
+        # need to be serialized or parsed for the comparison.
+        filled_txids = []
+        for txid, order in list(self.__open_orders.items()):
+            side, price = order.side, order.price
+            if (side == "buy" and price >= last) or (side == "sell" and price <= last):
+                self.fill_order(txid)
+                if self.__batch_executions:
+                    filled_txids.append(txid)
+                else:
+                    await callback(
+                        {
+                            "channel": "executions",
+                            "type": "update",
+                            "data": [{"exec_type": "filled", "order_id": txid}],
+                        },
+                    )
+
+        if filled_txids:
+            # Like Kraken, report all executions of this update in one message.
             await callback(
                 {
                     "channel": "executions",
                     "type": "update",
-                    "data": [{"exec_type": "filled", "order_id": txid}],
+                    "data": [
+                        {"exec_type": "filled", "order_id": txid}
+                        for txid in filled_txids
+                    ],
                 },
             )
 
-        for order in self.get_open_orders()["open"].values():
-            if (
-                order["descr"]["type"] == "buy"
-                and float(order["descr"]["price"]) >= last
-            ) or (
-                order["descr"]["type"] == "sell"
-                and float(order["descr"]["price"]) <= last
-            ):
-                await fill_order(order["txid"])
-
     def cancel_order(self: Self, txid: str) -> None:
         """Cancel an order and update balances if needed."""
-        order = self.__orders.get(txid, {})
-        if not order:
-            return
-
-        order.update({"status": "canceled"})
-        self.__orders[txid] = order
-
-        if order["descr"]["type"] == "buy":
-            executed_cost = float(order["vol_exec"]) * float(order["descr"]["price"])
-            remaining_cost = (
-                float(order["vol"]) * float(order["descr"]["price"]) - executed_cost
-            )
-            self.__balances["ZUSD"]["balance"] = str(
-                float(self.__balances["ZUSD"]["balance"]) + remaining_cost,
-            )
-            self.__balances["ZUSD"]["hold_trade"] = str(
-                float(self.__balances["ZUSD"]["hold_trade"]) - remaining_cost,
-            )
-            self.__balances["XXBT"]["balance"] = str(
-                float(self.__balances["XXBT"]["balance"]) - float(order["vol_exec"]),
-            )
-        elif order["descr"]["type"] == "sell":
-            remaining_volume = float(order["vol"]) - float(order["vol_exec"])
-            self.__balances["XXBT"]["balance"] = str(
-                float(self.__balances["XXBT"]["balance"]) + remaining_volume,
-            )
-            self.__balances["XXBT"]["hold_trade"] = str(
-                float(self.__balances["XXBT"]["hold_trade"]) - remaining_volume,
-            )
-            self.__balances["ZUSD"]["balance"] = str(
-                float(self.__balances["ZUSD"]["balance"]) - float(order["cost"]),
-            )
+        if (order := self.__orders.get(txid)) is not None:
+            self.__cancel_order(txid=txid, order=order)
+
+    def __cancel_order(self: Self, txid: str, order: MockOrder) -> None:
+        """Mark an order as cancelled and release its reserved funds."""
+        order.status = "canceled"
+        self.__open_orders.pop(txid, None)
+
+        vol = order.vol
+        vol_exec = order.vol_exec
+        if order.side == "buy":
+            price = order.price
+            remaining_cost = vol * price - vol_exec * price
+            self.__zusd["balance"] += remaining_cost
+            self.__zusd["hold_trade"] -= remaining_cost
+            self.__xxbt["balance"] -= vol_exec
+        elif order.side == "sell":
+            remaining_volume = vol - vol_exec
+            self.__xxbt["balance"] += remaining_volume
+            self.__xxbt["hold_trade"] -= remaining_volume
+            self.__zusd["balance"] -= order.cost
+
+    def cancel_order_batch(self: Self, orders: list[str]) -> dict:
+        """Cancel multiple orders."""
+        for txid in orders:
+            self.cancel_order(txid)
+        return {"count": len(orders)}
 
     def cancel_all_orders(self: Self, **kwargs: Any) -> None:  # noqa: ARG002
         """Cancel all open orders."""
-        for txid in self.__orders:
-            self.cancel_order(txid)
+        for txid, order in list(self.__open_orders.items()):
+            self.__cancel_order(txid=txid, order=order)
 
     def get_open_orders(self, **kwargs: Any) -> dict:  # noqa: ARG002
         """Get all open orders."""
         return {
-            "open": {k: v for k, v in self.__orders.items() if v["status"] == "open"},
+            "open": {
+                txid: order.to_dict()
+                for txid, order in self.__open_orders.items()
+            },
         }
 
-    def get_orders_info(self: Self, txid: str) -> dict:
-        """Get information about a specific order."""
-        if (order := self.__orders.get(txid, None)) is not None:
-            return {txid: order}
-        return {}
+    def get_orders_info(self: Self, txid: str | list[str]) -> dict:
+        """Get information about one or more orders."""
+        txids = txid if isinstance(txid, list) else txid.split(",")
+        return {
+            txid: order.to_dict()
+            for txid in txids
+            if (order := self.__orders.get(txid, None)) is not None
+        }
 
     def get_balances(self: Self, **kwargs: Any) -> dict:  # noqa: ARG002
         """Get the user's current balances."""
-        return self.__balances
+        return {
+            asset: {key: str(value) for key, value in balance.items()}
+            for asset, balance in self.__balances.items()
+        }
@@ -9,8 +9,11 @@
 
 
 from pathlib import Path
+from unittest import mock
 
 import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
 
 from kraken_infinity_grid.database import (
     Configuration,
@@ -182,6 +185,25 @@ def test_orderbook_update(orderbook: Orderbook, db_connect: DBConnect) -> None:
     assert updated_order["volume"] == 0.2
 
 
+def test_db_connect_init_db_creates_missing_indexes(sqlite_file: Path) -> None:
+    """Test that indexes are added to tables of already existing databases."""
+    db = DBConnect(sqlite_file=sqlite_file)
+    with db.engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE orderbook (id INTEGER PRIMARY KEY, userref INTEGER,"
+                " txid VARCHAR, symbol VARCHAR, side VARCHAR, price FLOAT,"
+                " volume FLOAT)",
+            ),
+        )
+
+    Orderbook(userref=123456789, db=db)
+    db.init_db()
+    assert [index["name"] for index in inspect(db.engine).get_indexes("orderbook")] == [
+        "ix_orderbook_txid",
+    ]
+
+
 def test_orderbook_count(orderbook: Orderbook) -> None:
     """Test counting orders in the orderbook."""
     order1 = {
@@ -206,6 +228,73 @@ def test_orderbook_count(orderbook: Orderbook) -> None:
     assert count == 0
 
 
+def test_orderbook_exists_and_count_side(orderbook: Orderbook) -> None:
+    """Test the in-memory existence check and count of orders per side."""
+    for txid, side in (("txid1", "buy"), ("txid2", "buy"), ("txid3", "sell")):
+        orderbook.add(
+            {
+                "txid": txid,
+                "descr": {"pair": "BTC/USD", "type": side, "price": "50000"},
+                "vol": "0.1",
+            },
+        )
+
+    assert orderbook.exists(txid="txid1")
+    assert not orderbook.exists(txid="txid4")
+    assert orderbook.count_side(side="buy") == 2
+    assert orderbook.count_side(side="buy", exclude_txid="txid1") == 1
+    assert orderbook.count_side(side="buy", exclude_txid="txid3") == 2
+    assert orderbook.count_side(side="sell", exclude_txid="txid3") == 0
+
+    orderbook.remove(filters={"txid": "txid1"})
+    assert not orderbook.exists(txid="txid1")
+    assert orderbook.count_side(side="buy") == 1
+
+    orderbook.update({"descr": {"type": "sell"}}, filters={"txid": "txid2"})
+    assert orderbook.count_side(side="buy") == 0
+    assert orderbook.count_side(side="sell") == 2
+
+    orderbook.remove(filters={"side": "sell"})
+    assert orderbook.count_side(side="sell") == 0
+    assert orderbook.count() == 0
+
+
+def test_orderbook_get_prices(orderbook: Orderbook) -> None:
+    """Test retrieving the sorted prices of the orders of a side."""
+    for txid, side, price in (
+        ("txid1", "buy", "49000"),
+        ("txid2", "buy", "48000"),
+        ("txid3", "buy", "49500"),
+        ("txid4", "sell", "51000"),
+        ("txid5", "sell", "50500"),
+        ("txid6", "sell", "52000"),
+    ):
+        orderbook.add(
+            {
+                "txid": txid,
+                "descr": {"pair": "BTC/USD", "type": side, "price": price},
+                "vol": "0.1",
+            },
+        )
+
+    assert orderbook.get_prices(side="buy", limit=2, descending=True) == [
+        49500.0,
+        49000.0,
+    ]
+    assert orderbook.get_prices(side="buy", limit=1) == [48000.0]
+    assert orderbook.get_prices(side="sell", limit=2) == [50500.0, 51000.0]
+    assert orderbook.get_prices(side="sell", limit=0) == []
+
+    orderbook.remove(filters={"txid": "txid3"})
+    orderbook.update({"descr": {"price": 50000.0}}, filters={"txid": "txid5"})
+    assert orderbook.get_prices(side="buy", descending=True) == [49000.0, 48000.0]
+    assert orderbook.get_prices(side="sell") == [
+        50000.0,
+        51000.0,
+        52000.0,
+    ]
+
+
 def test_configuration_get(configuration: Configuration) -> None:
     """Test getting configuration from the table."""
     result = configuration.get()
@@ -220,6 +309,34 @@ def test_configuration_update(configuration: Configuration) -> None:
     assert result["amount_per_grid"] == 10
 
 
+def test_configuration_cache(
+    configuration: Configuration,
+    db_connect: DBConnect,
+) -> None:
+    """Test that the configuration is read once and kept in sync on updates."""
+    with mock.patch.object(db_connect, "get_rows", wraps=db_connect.get_rows) as spy:
+        assert configuration.get()["interval"] is None
+        configuration.update({"interval": 0.02})
+        result = configuration.get()
+        assert result["interval"] == 0.02
+        assert spy.call_count == 1
+
+        # == Modifying the returned dict does not alter the cached configuration
+        result["interval"] = 0.5
+        assert configuration.get()["interval"] == 0.02
+
+        # == The cache is in sync with the table
+        assert configuration.get(filters={"interval": 0.02})["interval"] == 0.02
+        assert spy.call_count == 2
+
+    # == Updates that don't change anything are not written
+    with mock.patch.object(db_connect, "update_row") as mock_update_row:
+        configuration.update({"interval": 0.02})
+        mock_update_row.assert_not_called()
+        configuration.update({"interval": 0.02, "amount_per_grid": 100.0})
+        mock_update_row.assert_called_once()
+
+
 def test_unsold_buy_order_txids_add(
     unsold_buy_order_txids: UnsoldBuyOrderTXIDs,
     db_connect: DBConnect,
@@ -273,6 +390,29 @@ def test_unsold_buy_order_txids_count(
     assert count == 1
 
 
+def test_unsold_buy_order_txids_exists(
+    unsold_buy_order_txids: UnsoldBuyOrderTXIDs,
+    db_connect: DBConnect,
+) -> None:
+    """Test checking txids and counting them without querying the database."""
+    unsold_buy_order_txids.add(txid="txid1", price=50000.0)
+    assert unsold_buy_order_txids.exists(txid="txid1")
+    assert not unsold_buy_order_txids.exists(txid="txid2")
+
+    with mock.patch.object(db_connect, "get_rows") as mock_get_rows:
+        unsold_buy_order_txids.add(txid="txid2", price=49000.0)
+        unsold_buy_order_txids.remove(txid="txid1")
+        assert not unsold_buy_order_txids.exists(txid="txid1")
+        assert unsold_buy_order_txids.exists(txid="txid2")
+        assert unsold_buy_order_txids.count() == 1
+        mock_get_rows.assert_not_called()
+
+    # == Existing entries are loaded from the database
+    unsold_buy_order_txids._UnsoldBuyOrderTXIDs__txids = None
+    assert unsold_buy_order_txids.exists(txid="txid2")
+    assert unsold_buy_order_txids.count() == 1
+
+
 def test_pending_txids_add(
     pending_txids: PendingIXIDs,
     db_connect: DBConnect,
@@ -319,3 +459,79 @@ def test_pending_txids_count(pending_txids: PendingIXIDs) -> None:
 
     count = pending_txids.count(filters={"txid": "txid1"})
     assert count == 1
+
+
+def test_db_connect_transaction(
+    orderbook: Orderbook,
+    pending_txids: PendingIXIDs,
+    db_connect: DBConnect,
+) -> None:
+    """
+    Test that changes made within a transaction are committed at once and are
+    visible within the transaction.
+    """
+    with (
+        mock.patch.object(
+            db_connect.session,
+            "commit",
+            wraps=db_connect.session.commit,
+        ) as mock_commit,
+        db_connect.transaction(),
+    ):
+        pending_txids.add(txid="txid1")
+        orderbook.add(
+            {
+                "txid": "txid1",
+                "descr": {"pair": "BTC/USD", "type": "buy", "price": "50000"},
+                "vol": "0.1",
+            },
+        )
+        pending_txids.remove(txid="txid1")
+        with db_connect.transaction():  # nested transactions are joined
+            assert orderbook.count() == 1
+        mock_commit.assert_not_called()
+
+    mock_commit.assert_called_once()
+    assert orderbook.count() == 1
+    assert pending_txids.count() == 0
+
+
+@pytest.mark.parametrize("exception", [SQLAlchemyError, KeyError])
+def test_db_connect_transaction_rollback(
+    exception: type[Exception],
+    orderbook: Orderbook,
+    configuration: Configuration,
+    unsold_buy_order_txids: UnsoldBuyOrderTXIDs,
+    db_connect: DBConnect,
+) -> None:
+    """
+    Test that a transaction interrupted by any exception is rolled back and
+    that the in-memory copies of the tables do not keep the discarded changes.
+    """
+    vol_of_unfilled_remaining = configuration.get()["vol_of_unfilled_remaining"]
+    assert orderbook.count_side(side="buy") == 0
+    assert not unsold_buy_order_txids.exists(txid="txid1")
+
+    def failing_transaction() -> None:
+        with db_connect.transaction():
+            orderbook.add(
+                {
+                    "txid": "txid1",
+                    "descr": {"pair": "BTC/USD", "type": "buy", "price": "50000"},
+                    "vol": "0.1",
+                },
+            )
+            configuration.update({"vol_of_unfilled_remaining": 0.5})
+            unsold_buy_order_txids.add(txid="txid1", price=50000.0)
+            assert orderbook.count_side(side="buy") == 1
+            raise exception("failure")
+
+    with pytest.raises(exception):
+        failing_transaction()
+
+    assert orderbook.count_side(side="buy") == 0
+    assert orderbook.get_prices(side="buy") == []
+    assert (
+        configuration.get()["vol_of_unfilled_remaining"] == vol_of_unfilled_remaining
+    )
+    assert not unsold_buy_order_txids.exists(txid="txid1")
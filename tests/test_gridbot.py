@@ -7,7 +7,10 @@
 
 """Unit tests for the KrakenInfinityGridBot class."""
 
+import asyncio
 import logging
+from decimal import Decimal
+from time import sleep
 from unittest import mock
 
 import pytest
@@ -88,16 +91,51 @@ def test_get_balances(instance: KrakenInfinityGridBot) -> None:
     assert balances["quote_available"] == 900.0
 
 
+def test_truncate(instance: KrakenInfinityGridBot) -> None:
+    """Test the truncate method."""
+    instance.pair_decimals = 1
+    instance.lot_decimals = 8
+    instance.ordermin = Decimal("0.00005")
+    instance.costmin = Decimal("0.5")
+
+    assert instance.truncate(amount=21123.12849829993, amount_type="price") == "21123.1"
+    assert instance.truncate(amount=21123, amount_type="price") == "21123.0"
+    assert instance.truncate(amount=0.123456789, amount_type="volume") == "0.12345678"
+    assert instance.truncate(amount=0.1, amount_type="volume") == "0.10000000"
+    assert (
+        instance.truncate(amount=Decimal(100) / Decimal(3), amount_type="volume")
+        == "33.33333333"
+    )
+
+    with pytest.raises(ValueError, match=r"Price is less than the costmin.*"):
+        instance.truncate(amount=0.1, amount_type="price")
+    with pytest.raises(ValueError, match=r"Volume is less than the ordermin.*"):
+        instance.truncate(amount=0.00001, amount_type="volume")
+    with pytest.raises(ValueError, match=r"Amount type must be.*"):
+        instance.truncate(amount=1, amount_type="invalid")
+
+
 def test_get_current_buy_prices(
     instance: KrakenInfinityGridBot,
 ) -> None:
     """Test the get_current_buy_prices method."""
 
-    instance.orderbook.get_orders.return_value = [
-        {"price": 50000.0},
-        {"price": 49000.0},
-    ]
+    instance.orderbook.get_prices.return_value = [50000.0, 49000.0]
     assert list(instance.get_current_buy_prices()) == [50000.0, 49000.0]
+    instance.orderbook.get_prices.assert_called_once_with(
+        side="buy",
+        descending=True,
+    )
+
+
+def test_get_lowest_buy_price(instance: KrakenInfinityGridBot) -> None:
+    """Test the get_lowest_buy_price method."""
+    instance.orderbook.get_prices.return_value = [49000.0]
+    assert instance.get_lowest_buy_price() == 49000.0
+    instance.orderbook.get_prices.assert_called_once_with(side="buy", limit=1)
+
+    instance.orderbook.get_prices.return_value = []
+    assert instance.get_lowest_buy_price() is None
 
 
 def test_get_order_price_sell(instance: KrakenInfinityGridBot) -> None:
@@ -143,6 +181,9 @@ def test_get_order_price_buy(instance: KrakenInfinityGridBot) -> None:
     price = instance.get_order_price(side="buy", last_price=49000.0)
     assert price == pytest.approx(48514.851485148514)
 
+    # The price of the highest buy is only relevant for sell orders
+    instance.configuration.get.assert_not_called()
+
 
 def test_get_order_price_invalid_side(instance: KrakenInfinityGridBot) -> None:
     """Test the get_order_price method with an invalid side."""
@@ -188,6 +229,7 @@ def test_max_investment_reached(instance: KrakenInfinityGridBot) -> None:
         {"price": 49000.0, "volume": 0.2},
     ]
     assert not instance.max_investment_reached
+    instance.orderbook.get_orders.assert_called_once_with()
 
     # Case where max investment is reached
     instance.orderbook.get_orders.return_value = [
@@ -251,6 +293,81 @@ async def test_on_message(
     instance.sm.prepare_for_trading.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_on_message_concurrent_setup(instance: KrakenInfinityGridBot) -> None:
+    """
+    Test that messages arriving while preparing for trading don't run the
+    setup again and that missed executions are processed only once.
+    """
+
+    def prepare_for_trading() -> None:
+        sleep(0.3)
+        instance.state_machine.facts["ready_to_trade"] = True
+
+    instance.sm.prepare_for_trading.side_effect = prepare_for_trading
+    instance.state_machine.facts["ticker_channel_connected"] = True
+    execution = {
+        "channel": "executions",
+        "type": "update",
+        "data": [{"exec_type": "filled", "order_id": "txid1"}],
+    }
+
+    await asyncio.gather(
+        instance.on_message(execution),
+        instance.on_message(
+            {"channel": "executions", "type": "snapshot", "data": [{}]},
+        ),
+    )
+
+    instance.sm.prepare_for_trading.assert_called_once()
+    instance.om.handle_filled_order_event.assert_called_once_with("txid1")
+
+
+@pytest.mark.asyncio
+async def test_on_message_order_while_processing_missed_messages(
+    instance: KrakenInfinityGridBot,
+) -> None:
+    """
+    Test that messages arriving while missed executions are processed are
+    handled after them.
+    """
+
+    def prepare_for_trading() -> None:
+        instance.state_machine.facts["ready_to_trade"] = True
+
+    instance.sm.prepare_for_trading.side_effect = prepare_for_trading
+    instance.om.handle_filled_order_event.side_effect = lambda _: sleep(0.2)
+
+    def execution(txid: str) -> dict:
+        return {
+            "channel": "executions",
+            "type": "update",
+            "data": [{"exec_type": "filled", "order_id": txid}],
+        }
+
+    # Executions are missed as long as the ticker channel is not connected.
+    await instance.on_message(execution("txid1"))
+    await instance.on_message(execution("txid2"))
+    instance.om.handle_filled_order_event.assert_not_called()
+
+    async def delayed_execution() -> None:
+        await asyncio.sleep(0.1)
+        await instance.on_message(execution("txid3"))
+
+    await asyncio.gather(
+        instance.on_message(
+            {"channel": "ticker", "data": [{"symbol": "BTC/USD", "last": 50000.0}]},
+        ),
+        delayed_execution(),
+    )
+
+    assert instance.om.handle_filled_order_event.call_args_list == [
+        mock.call("txid1"),
+        mock.call("txid2"),
+        mock.call("txid3"),
+    ]
+
+
 @pytest.mark.asyncio
 async def test_on_message_failing_subscribe(
     instance: KrakenInfinityGridBot,
@@ -312,9 +429,14 @@ async def test_on_message_ticker(instance: KrakenInfinityGridBot) -> None:
             ],
         },
     )
+    assert instance.ticker.last == 51000.0
+
     # == Ensure missed sell orders will be handled in case there are any
     assert instance.om.add_missed_sell_orders.call_count == 2
 
+    # == Ensure that the last price time is not saved on every ticker message
+    instance.configuration.update.assert_called_once()
+
     # == Ensure price range check is performed on new price
     assert instance.om.check_price_range.call_count == 2
 
@@ -362,6 +484,22 @@ async def test_on_message_executions(instance: KrakenInfinityGridBot) -> None:
         },
     )
     instance.om.handle_filled_order_event.assert_called_once_with("txid1")
+    instance.om.get_orders_info_bulk.assert_not_called()
+
+    # == Multiple filled orders are fetched at once
+    await instance.on_message(
+        {
+            "channel": "executions",
+            "type": "update",
+            "data": [
+                {"exec_type": "filled", "order_id": "txid2"},
+                {"exec_type": "filled", "order_id": "txid3"},
+            ],
+        },
+    )
+    instance.om.get_orders_info_bulk.assert_called_once_with(txids=["txid2", "txid3"])
+    instance.om.handle_filled_order_event.assert_any_call("txid2")
+    instance.om.handle_filled_order_event.assert_any_call("txid3")
 
     # == Send a new execution message for canceled or expired orders
     await instance.on_message(
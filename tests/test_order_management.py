@@ -8,13 +8,15 @@
 """Unit tests for the OrderManager class."""
 
 import sys
+from decimal import Decimal
 from unittest import mock
 
 import pytest
+from kraken.exceptions import KrakenUnknownOrderError
 
 from kraken_infinity_grid.exceptions import GridBotStateError
 from kraken_infinity_grid.gridbot import KrakenInfinityGridBot
-from kraken_infinity_grid.order_management import OrderManager
+from kraken_infinity_grid.order_management import OrderManager, RateLimiter
 from kraken_infinity_grid.state_machine import StateMachine, States
 
 
@@ -26,6 +28,7 @@ def strategy() -> mock.Mock:
     strategy.user = mock.Mock()
     strategy.market = mock.Mock()
     strategy.configuration = mock.Mock()
+    strategy.database = mock.MagicMock()
     strategy.orderbook = mock.Mock()
     strategy.om = mock.Mock()
     strategy.t = mock.Mock()
@@ -38,12 +41,14 @@ def strategy() -> mock.Mock:
     strategy.get_active_buy_orders = mock.Mock()
     strategy.get_active_sell_orders = mock.Mock()
     strategy.get_orders_info_with_retry = mock.Mock()
+    strategy.truncate = mock.Mock()
     strategy.dry_run = False
     strategy.max_investment = 10000
     strategy.amount_per_grid = 100
     strategy.n_open_buy_orders = 5
     strategy.interval = 0.01
     strategy.fee = 0.0026
+    strategy.sell_fee_factor = 1 - 2 * Decimal(strategy.fee)
     strategy.symbol = "BTC/USD"
     strategy.altname = "BTCUSD"
     strategy.base_currency = "BTC"
@@ -177,9 +182,9 @@ def test_check_pending_txids(
 ##
 
 
-@mock.patch.object(OrderManager, "handle_cancel_order")
+@mock.patch.object(OrderManager, "_OrderManager__cancel_orders")
 def test_check_near_buy_orders_cancel(
-    mock_handle_cancel_order: mock.Mock,  # noqa: ARG001
+    mock_cancel_orders: mock.Mock,
     order_manager: OrderManager,
     strategy: mock.Mock,
 ) -> None:
@@ -191,9 +196,25 @@ def test_check_near_buy_orders_cancel(
         {"txid": "txid3", "price": 49940.0},
     ]
     order_manager._OrderManager__check_near_buy_orders()
-    order_manager.handle_cancel_order.assert_any_call(txid="txid1")
-    order_manager.handle_cancel_order.assert_any_call(txid="txid2")
-    assert order_manager.handle_cancel_order.call_count == 2
+    mock_cancel_orders.assert_called_once_with(txids=["txid1", "txid2"])
+    strategy.orderbook.get_orders.assert_called_once_with(filters={"side": "buy"})
+
+
+@mock.patch.object(OrderManager, "_OrderManager__cancel_orders")
+def test_check_near_buy_orders_cancel_same_price(
+    mock_cancel_orders: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """Test that only one of multiple buy orders with the same price survives."""
+    strategy.get_current_buy_prices.return_value = [50000.0, 50000.0, 50000.0]
+    strategy.orderbook.get_orders.return_value = [
+        {"txid": "txid1", "price": 50000.0},
+        {"txid": "txid2", "price": 50000.0},
+        {"txid": "txid3", "price": 50000.0},
+    ]
+    order_manager._OrderManager__check_near_buy_orders()
+    mock_cancel_orders.assert_called_once_with(txids=["txid1", "txid2"])
 
 
 @mock.patch.object(OrderManager, "handle_cancel_order")
@@ -208,6 +229,7 @@ def test_check_near_buy_orders_good_distance(
     strategy.get_current_buy_prices.return_value = [50000.0, 49500.0, 49005]
     order_manager._OrderManager__check_near_buy_orders()
     strategy.get_active_buy_orders.assert_not_called()
+    strategy.orderbook.get_orders.assert_not_called()
 
 
 @mock.patch.object(OrderManager, "handle_cancel_order")
@@ -251,14 +273,8 @@ def test_check_n_open_buy_orders(
     strategy.get_balances.return_value = {"quote_available": 10000.0}
     # No pending transactions
     strategy.pending_txids.count.return_value = 0
-    # The buy prices before each following buy order is placed
-    strategy.get_current_buy_prices.side_effect = [
-        [50000.0],
-        [50000.0, 49900.0],
-        [50000.0, 49900.0, 49800.0],
-        [50000.0, 49900.0, 49800.0, 49700.0],
-        [50000.0, 49900.0, 49800.0, 49700.0, 49600.0],
-    ]
+    # The lowest buy prices before each following buy order is placed
+    strategy.get_lowest_buy_price.side_effect = [50000.0, 49900.0, 49800.0, 49700.0]
     # The buy prices for each following buy order
     strategy.get_order_price.side_effect = [49900.0, 49800.0, 49700.0, 49600.0]
     # The orders that are currently open
@@ -289,15 +305,18 @@ def test_check_n_open_buy_orders(
             {"txid": "txid4", "price": 49600.0},
         ],
     ]
-    strategy.orderbook.count.side_effect = [1, 2, 3, 4, 5]
+    strategy.orderbook.count_side.side_effect = [1, 2, 3, 4, 5]
 
     order_manager._OrderManager__check_n_open_buy_orders()
     for price in (49900.0, 49800.0, 49700.0, 49600.0):
         mock_handle_arbitrage.assert_any_call(
             side="buy",
             order_price=price,
+            balances={"quote_available": 10000.0},
         )
     assert mock_handle_arbitrage.call_count == 4
+    for price in (50000.0, 49900.0, 49800.0, 49700.0):
+        strategy.get_order_price.assert_any_call(side="buy", last_price=price)
 
 
 @mock.patch.object(OrderManager, "handle_arbitrage")
@@ -328,16 +347,96 @@ def test_check_lowest_cancel_of_more_than_n_buy_orders(
 ) -> None:
     """Test checking and canceling the lowest buy order if there are more than n
     open buy orders."""
+    strategy.dry_run = False
+    strategy.altname = "BTCUSD"
     strategy.n_open_buy_orders = 1
-    strategy.orderbook.count.return_value = 3
+    strategy.orderbook.count_side.return_value = 3
+    strategy.orderbook.exists.return_value = True
     strategy.orderbook.get_orders.return_value = [
         {"txid": "txid2", "price": 49900.0},
         {"txid": "txid3", "price": 49800.0},
     ]
+    strategy.user.get_orders_info.return_value = {
+        txid: {
+            "descr": {"pair": "BTCUSD", "price": price},
+            "userref": 13456789,
+            "vol_exec": "0.0",
+        }
+        for txid, price in (("txid2", 49900.0), ("txid3", 49800.0))
+    }
     order_manager._OrderManager__check_lowest_cancel_of_more_than_n_buy_orders()
-    mock_handle_cancel_order.assert_any_call(txid="txid2")
-    mock_handle_cancel_order.assert_any_call(txid="txid3")
-    assert mock_handle_cancel_order.call_count == 2
+
+    # == The orders are queried before and after cancelling them, in order to
+    ##   save volume that was executed until cancelling.
+    assert strategy.user.get_orders_info.call_args_list == [
+        mock.call(txid=["txid2", "txid3"]),
+        mock.call(txid=["txid2", "txid3"]),
+    ]
+    strategy.trade.cancel_order_batch.assert_called_once_with(
+        orders=["txid2", "txid3"],
+    )
+    strategy.orderbook.remove.assert_any_call(filters={"txid": "txid2"})
+    strategy.orderbook.remove.assert_any_call(filters={"txid": "txid3"})
+    mock_handle_cancel_order.assert_not_called()
+
+
+@mock.patch.object(OrderManager, "handle_cancel_order")
+def test_check_lowest_cancel_of_more_than_n_buy_orders_batch_failing(
+    mock_handle_cancel_order: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test that the orders are cancelled individually if the batch request fails,
+    e.g. because one of the orders was closed in the meantime.
+    """
+    strategy.dry_run = False
+    strategy.altname = "BTCUSD"
+    strategy.n_open_buy_orders = 1
+    strategy.orderbook.count_side.return_value = 3
+    strategy.orderbook.exists.return_value = True
+    strategy.orderbook.get_orders.return_value = [
+        {"txid": "txid2", "price": 49900.0},
+        {"txid": "txid3", "price": 49800.0},
+    ]
+    strategy.user.get_orders_info.return_value = {
+        txid: {
+            "descr": {"pair": "BTCUSD", "price": price},
+            "userref": 13456789,
+            "vol_exec": "0.0",
+        }
+        for txid, price in (("txid2", 49900.0), ("txid3", 49800.0))
+    }
+    strategy.trade.cancel_order_batch.side_effect = KrakenUnknownOrderError
+
+    order_manager._OrderManager__check_lowest_cancel_of_more_than_n_buy_orders()
+
+    assert mock_handle_cancel_order.call_args_list == [
+        mock.call(txid="txid2"),
+        mock.call(txid="txid3"),
+    ]
+    # == The individually cancelled orders are not handled a second time
+    strategy.user.get_orders_info.assert_called_once()
+    strategy.orderbook.remove.assert_not_called()
+
+
+@mock.patch.object(OrderManager, "handle_cancel_order")
+def test_check_lowest_cancel_of_more_than_n_buy_orders_single(
+    mock_handle_cancel_order: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """Test that a single surplus buy order is cancelled individually."""
+    strategy.dry_run = False
+    strategy.n_open_buy_orders = 2
+    strategy.orderbook.count_side.return_value = 3
+    strategy.orderbook.get_orders.return_value = [
+        {"txid": "txid3", "price": 49800.0},
+    ]
+    order_manager._OrderManager__check_lowest_cancel_of_more_than_n_buy_orders()
+
+    mock_handle_cancel_order.assert_called_once_with(txid="txid3")
+    strategy.trade.cancel_order_batch.assert_not_called()
 
 
 @mock.patch.object(OrderManager, "check_price_range")
@@ -349,12 +448,37 @@ def test_shift_buy_orders_up(
     strategy: mock.Mock,
 ) -> None:
     """Test shifting buy orders up."""
-    strategy.orderbook.count.return_value = 2
+    strategy.orderbook.count_side.return_value = 2
     strategy.ticker.last = 60000.0
-    strategy.orderbook.get_orders.return_value.first.return_value = {"price": 50000.0}
+    strategy.orderbook.get_prices.return_value = [50000.0]
     assert order_manager._OrderManager__shift_buy_orders_up() is True
     mock_cancel_all_open_buy_orders.assert_called_once()
     mock_check_price_range.assert_called_once()
+    strategy.orderbook.get_prices.assert_called_once_with(
+        side="buy",
+        limit=1,
+        descending=True,
+    )
+
+
+@mock.patch.object(OrderManager, "check_price_range")
+@mock.patch.object(OrderManager, "cancel_all_open_buy_orders")
+def test_shift_buy_orders_up_not_required(
+    mock_cancel_all_open_buy_orders: mock.Mock,
+    mock_check_price_range: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """Test not shifting buy orders up if the price is within the range."""
+    strategy.ticker.last = 50000.0 * 1.01 * 1.01
+    strategy.orderbook.get_prices.return_value = [50000.0]
+    assert order_manager._OrderManager__shift_buy_orders_up() is False
+
+    strategy.orderbook.get_prices.return_value = []
+    assert order_manager._OrderManager__shift_buy_orders_up() is False
+
+    mock_cancel_all_open_buy_orders.assert_not_called()
+    mock_check_price_range.assert_not_called()
 
 
 @mock.patch.object(OrderManager, "handle_arbitrage")
@@ -365,7 +489,7 @@ def test_check_extra_sell_order(
 ) -> None:
     """Test checking and placing an extra sell order for the SWING strategy."""
     strategy.strategy = "GridHODL"
-    strategy.orderbook.count.return_value = 0
+    strategy.orderbook.count_side.return_value = 0
     strategy.get_balances.return_value = {"base_available": 1.0}
     strategy.get_order_price.return_value = 51000.0
 
@@ -450,6 +574,7 @@ def test_handle_arbitrage(
     mock_new_buy_order.assert_called_once_with(
         order_price=50000.0,
         txid_to_delete=None,
+        balances=None,
     )
 
     order_manager.handle_arbitrage(side="sell", order_price=51000.0)
@@ -459,6 +584,38 @@ def test_handle_arbitrage(
     )
 
 
+@mock.patch("kraken_infinity_grid.order_management.sleep", return_value=None)
+@mock.patch("kraken_infinity_grid.order_management.monotonic", return_value=0.0)
+def test_rate_limiter_burst(
+    mock_monotonic: mock.Mock,  # noqa: ARG001
+    mock_sleep: mock.Mock,
+) -> None:
+    """Test that the rate limiter only waits once the bucket has run empty."""
+    limiter = RateLimiter(max_tokens=3, refill_per_sec=2.0)
+    for _ in range(3):
+        limiter.acquire()
+    mock_sleep.assert_not_called()
+
+    limiter.acquire()
+    mock_sleep.assert_called_once_with(0.5)
+
+
+@mock.patch("kraken_infinity_grid.order_management.sleep", return_value=None)
+@mock.patch("kraken_infinity_grid.order_management.monotonic")
+def test_rate_limiter_refill(
+    mock_monotonic: mock.Mock,
+    mock_sleep: mock.Mock,
+) -> None:
+    """Test that the tokens of the rate limiter are refilled over time."""
+    mock_monotonic.return_value = 0.0
+    limiter = RateLimiter(max_tokens=1, refill_per_sec=2.0)
+    limiter.acquire()
+
+    mock_monotonic.return_value = 0.5
+    limiter.acquire()
+    mock_sleep.assert_not_called()
+
+
 # ==============================================================================
 # new_buy_order
 ##
@@ -474,9 +631,9 @@ def test_new_buy_order(
     strategy.max_investment_reached = False
     strategy.get_value_of_orders.return_value = 5000.0
     strategy.trade.create_order.return_value = {"txid": ["txid1"]}
-    strategy.trade.truncate.side_effect = [50000.0, 100.0]  # price, volume
+    strategy.truncate.side_effect = [50000.0, 100.0]  # price, volume
     # No other open orders
-    strategy.orderbook.count.return_value = 0
+    strategy.orderbook.count_side.return_value = 0
 
     order_manager.new_buy_order(order_price=50000.0)
     strategy.pending_txids.add.assert_called_once_with("txid1")
@@ -484,6 +641,24 @@ def test_new_buy_order(
     strategy.om.assign_order_by_txid.assert_called_once_with("txid1")
 
 
+def test_new_buy_order_passed_balances(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """Test that passed balances are not fetched again."""
+    strategy.max_investment_reached = False
+    strategy.trade.create_order.return_value = {"txid": ["txid1"]}
+    strategy.truncate.side_effect = [50000.0, 100.0]  # price, volume
+    strategy.orderbook.count_side.return_value = 0
+
+    order_manager.new_buy_order(
+        order_price=50000.0,
+        balances={"quote_available": 1000.0},
+    )
+    strategy.get_balances.assert_not_called()
+    strategy.trade.create_order.assert_called_once()
+
+
 def test_new_buy_order_max_invest_reached(
     order_manager: OrderManager,
     strategy: mock.Mock,
@@ -491,7 +666,7 @@ def test_new_buy_order_max_invest_reached(
     """Test placing a new buy order without sufficient funds."""
     strategy.max_investment_reached = True
     # No other open orders
-    strategy.orderbook.count.return_value = 0
+    strategy.orderbook.count_side.return_value = 0
 
     order_manager.new_buy_order(order_price=50000.0)
     strategy.trade.create_order.assert_not_called()
@@ -506,9 +681,9 @@ def test_new_buy_order_not_enough_funds(
     strategy.get_balances.return_value = {"quote_available": 0.0}
     strategy.get_value_of_orders.return_value = 5000.0
     strategy.trade.create_order.return_value = {"txid": ["txid1"]}
-    strategy.trade.truncate.side_effect = [50000.0, 100.0]  # price, volume
+    strategy.truncate.side_effect = [50000.0, 100.0]  # price, volume
     # No other open orders
-    strategy.orderbook.count.return_value = 0
+    strategy.orderbook.count_side.return_value = 0
 
     order_manager.new_buy_order(order_price=50000.0)
     strategy.trade.create_order.assert_not_called()
@@ -543,7 +718,7 @@ def test_new_sell_order_GridSell(
     strategy.get_balances.return_value = {"base_available": 1.0}
 
     # Handling the txid to delete
-    strategy.unsold_buy_order_txids.get.return_value.first.return_value = []
+    strategy.unsold_buy_order_txids.exists.return_value = False
 
     # The unsold buy order of which the volume is now to be sold
     strategy.user.get_orders_info.return_value = {
@@ -551,7 +726,7 @@ def test_new_sell_order_GridSell(
     }
     # The price and volume of the unsold buy order (volume equals vol_exec for
     # GridSell)
-    strategy.trade.truncate.side_effect = [0.1, 52000.0]  # volume, price
+    strategy.truncate.side_effect = [0.1, 52000.0]  # volume, price
     strategy.trade.create_order.return_value = {"txid": ["txid2"]}
 
     order_manager.new_sell_order(order_price=52000.0, txid_to_delete="txid1")
@@ -577,6 +752,38 @@ def test_new_sell_order_GridSell(
     strategy.om.assign_order_by_txid.assert_called_once_with(txid="txid2")
 
 
+def test_new_sell_order_transaction_without_requests(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test that the bookkeeping of a placed sell order is committed before the
+    order details are requested.
+    """
+    strategy.strategy = "GridSell"
+    strategy.get_balances.return_value = {"base_available": 1.0}
+    strategy.unsold_buy_order_txids.exists.return_value = True
+    strategy.user.get_orders_info.return_value = {
+        "txid1": {"status": "closed", "vol_exec": 0.1},
+    }
+    strategy.truncate.side_effect = [0.1, 52000.0]  # volume, price
+    strategy.trade.create_order.return_value = {"txid": ["txid2"]}
+
+    calls = mock.Mock()
+    calls.attach_mock(strategy.database.transaction.return_value, "transaction")
+    calls.attach_mock(strategy.trade.create_order, "create_order")
+    calls.attach_mock(strategy.om.assign_order_by_txid, "assign_order_by_txid")
+
+    order_manager.new_sell_order(order_price=52000.0, txid_to_delete="txid1")
+
+    assert [name for name, *_ in calls.mock_calls] == [
+        "create_order",
+        "transaction.__enter__",
+        "transaction.__exit__",
+        "assign_order_by_txid",
+    ]
+
+
 @pytest.mark.parametrize("strategy_name", ["SWING", "GridHODL"])
 def test_new_sell_order(
     order_manager: OrderManager,
@@ -591,7 +798,7 @@ def test_new_sell_order(
     strategy.get_balances.return_value = {"base_available": 1.0}
 
     # Handling the txid to delete
-    strategy.unsold_buy_order_txids.get.return_value.first.return_value = []
+    strategy.unsold_buy_order_txids.exists.return_value = False
 
     # The unsold buy order of which the volume is now to be sold
     strategy.user.get_orders_info.return_value = {
@@ -599,7 +806,7 @@ def test_new_sell_order(
     }
 
     # The price and volume of the unsold buy order
-    strategy.trade.truncate.side_effect = [52000.0, 0.1]  # price, volume
+    strategy.truncate.side_effect = [52000.0, 0.1]  # price, volume
     strategy.trade.create_order.return_value = {"txid": ["txid2"]}
 
     order_manager.new_sell_order(order_price=52000.0, txid_to_delete="txid1")
@@ -625,6 +832,86 @@ def test_new_sell_order(
     strategy.om.assign_order_by_txid.assert_called_once_with(txid="txid2")
 
 
+def test_new_sell_order_buy_order_not_closed_retry(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test placing a new sell order, waiting for the corresponding buy order to
+    be closed upstream.
+    """
+    strategy.strategy = "GridHODL"
+    strategy.get_balances.return_value = {"base_available": 1.0}
+    strategy.unsold_buy_order_txids.exists.return_value = False
+    strategy.user.get_orders_info.side_effect = [
+        {"txid1": {"status": "open", "vol_exec": 0.1}},
+        {"txid1": {"status": "open", "vol_exec": 0.1}},
+        {"txid1": {"status": "closed", "vol_exec": 0.1}},
+    ]
+    strategy.truncate.side_effect = [52000.0, 0.1]  # price, volume
+    strategy.trade.create_order.return_value = {"txid": ["txid2"]}
+
+    with mock.patch.object(
+        order_manager._OrderManager__stop_event,
+        "wait",
+        return_value=False,
+    ) as mock_wait:
+        order_manager.new_sell_order(order_price=52000.0, txid_to_delete="txid1")
+
+    assert mock_wait.call_count == 2
+    assert strategy.user.get_orders_info.call_count == 3
+    strategy.trade.create_order.assert_called_once()
+    strategy.orderbook.remove.assert_called_once_with(filters={"txid": "txid1"})
+
+
+def test_new_sell_order_buy_order_not_closed_stopped(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test that waiting for the corresponding buy order to be closed is aborted
+    when the bot is stopped, while keeping the buy order as unsold.
+    """
+    strategy.strategy = "GridHODL"
+    strategy.unsold_buy_order_txids.exists.return_value = False
+    strategy.user.get_orders_info.return_value = {
+        "txid1": {"status": "open", "vol_exec": 0},
+    }
+
+    order_manager.stop()
+    order_manager.new_sell_order(order_price=52000.0, txid_to_delete="txid1")
+
+    strategy.unsold_buy_order_txids.add.assert_called_once_with(
+        txid="txid1",
+        price=52000.0,
+    )
+    strategy.trade.create_order.assert_not_called()
+    strategy.unsold_buy_order_txids.remove.assert_not_called()
+
+
+def test_new_sell_order_fetches_balances(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test that the balances are fetched for every sell order, so that a sell
+    order is never sized based on outdated balances.
+    """
+    strategy.strategy = "GridHODL"
+    strategy.get_balances.side_effect = [
+        {"base_available": 0.25},
+        {"base_available": 0.05},
+    ]
+    strategy.truncate.side_effect = [52000.0, 0.1] * 2  # price, volume
+    strategy.trade.create_order.return_value = {"txid": ["txid2"]}
+
+    order_manager.new_sell_order(order_price=52000.0)
+    order_manager.new_sell_order(order_price=52000.0)
+
+    assert strategy.get_balances.call_count == 2
+    strategy.trade.create_order.assert_called_once()
+
+
 @pytest.mark.parametrize("strategy_name", ["SWING", "GridHODL"])
 def test_new_sell_order_not_enough_funds(
     order_manager: OrderManager,
@@ -640,7 +927,7 @@ def test_new_sell_order_not_enough_funds(
     strategy.get_balances.return_value = {"base_available": 0.0}
 
     # Handling the txid to delete
-    strategy.unsold_buy_order_txids.get.return_value.first.return_value = []
+    strategy.unsold_buy_order_txids.exists.return_value = False
 
     # The unsold buy order of which the volume is now to be sold
     strategy.user.get_orders_info.return_value = {
@@ -648,7 +935,7 @@ def test_new_sell_order_not_enough_funds(
     }
 
     # The price and volume of the unsold buy order
-    strategy.trade.truncate.side_effect = [52000.0, 0.1]  # price, volume
+    strategy.truncate.side_effect = [52000.0, 0.1]  # price, volume
     strategy.trade.create_order.return_value = {"txid": ["txid2"]}
 
     order_manager.new_sell_order(order_price=52000.0, txid_to_delete="txid1")
@@ -694,9 +981,19 @@ def test_handle_filled_order_event_buy(
         "vol_exec": 0.1,
     }
     strategy.get_order_price.return_value = 51000.0
+    strategy.symbol = "BTC/USD"
+    strategy.base_currency = "BTC"
+    strategy.quote_currency = "USD"
+    strategy.cost_decimals = 5
     order_manager.handle_filled_order_event(txid="txid1")
 
-    strategy.t.send_to_telegram.assert_called_once()
+    strategy.t.send_to_telegram.assert_called_once_with(
+        message="✅ BTC/USD: Buy order executed"
+        "\n ├ Price » 50000.0 USD"
+        "\n ├ Size » 0.1 BTC"
+        "\n └ Size in USD » 5000.0",
+    )
+    strategy.get_order_price.assert_called_once_with(side="sell", last_price=50000.0)
     mock_handle_arbitrage.assert_called_once_with(
         side="sell",
         order_price=51000.0,
@@ -765,7 +1062,7 @@ def test_handle_filled_order_event_sell_place_no_new_buy(
         "userref": 13456789,
         "vol_exec": 0.1,
     }
-    strategy.orderbook.count.return_value = 0  # no open sell orders
+    strategy.orderbook.count_side.return_value = 0  # no open sell orders
     strategy.get_order_price.return_value = 51000.0
     order_manager.handle_filled_order_event(txid="txid2")
 
@@ -824,9 +1121,23 @@ def test_handle_filled_order_event_buy_order_not_closed_retry(
     ]
 
     strategy.get_order_price.return_value = 51000.0
-    with mock.patch("kraken_infinity_grid.order_management.sleep", return_value=None):
+    with mock.patch.object(
+        order_manager._OrderManager__stop_event,
+        "wait",
+        return_value=False,
+    ) as mock_wait:
         order_manager.handle_filled_order_event(txid="txid1")
 
+    assert mock_wait.call_args_list == [
+        mock.call(timeout=3),
+        mock.call(timeout=4),
+        mock.call(timeout=5),
+    ]
+    # The order details are re-fetched bypassing the cache while waiting.
+    assert mock_get_orders_info_with_retry.call_args_list[1:] == [
+        mock.call(txid="txid1", exit_on_fail=False, use_cache=False),
+    ] * 3
+
     strategy.t.send_to_telegram.assert_called_once()
     mock_handle_arbitrage.assert_called_once_with(
         side="sell",
@@ -844,8 +1155,8 @@ def test_handle_filled_order_event_buy_order_not_closed_retry_failing(
     caplog: pytest.LogCaptureFixture,
 ) -> None:
     """
-    Test handling a filled order event that fails too often an triggers a recall
-    of themselves.
+    Test handling a filled order event that fails too often and keeps on
+    waiting for the order to be closed.
     """
     mock_get_orders_info_with_retry.side_effect = [
         {
@@ -864,12 +1175,15 @@ def test_handle_filled_order_event_buy_order_not_closed_retry_failing(
         },
     ]
 
-    with (
-        mock.patch("kraken_infinity_grid.order_management.sleep", return_value=None),
+    with mock.patch.object(
+        order_manager._OrderManager__stop_event,
+        "wait",
+        return_value=False,
     ):
         order_manager.handle_filled_order_event(txid="txid1")
 
     mock_handle_arbitrage.assert_called_once()
+    assert mock_get_orders_info_with_retry.call_count == 5
 
     assert (
         "Can not handle filled order, since the fetched order is not closed in upstream!"
@@ -877,6 +1191,30 @@ def test_handle_filled_order_event_buy_order_not_closed_retry_failing(
     )
 
 
+@mock.patch.object(OrderManager, "get_orders_info_with_retry")
+@mock.patch.object(OrderManager, "handle_arbitrage")
+def test_handle_filled_order_event_buy_order_not_closed_stopped(
+    mock_handle_arbitrage: mock.Mock,
+    mock_get_orders_info_with_retry: mock.Mock,
+    order_manager: OrderManager,
+) -> None:
+    """
+    Test that waiting for a filled order to be closed upstream is aborted if
+    the algorithm is stopped.
+    """
+    mock_get_orders_info_with_retry.return_value = {
+        "descr": {"pair": "BTCUSD", "type": "buy", "price": 50000.0},
+        "status": "open",
+        "userref": 13456789,
+        "vol_exec": 0.1,
+    }
+    order_manager.stop()
+    order_manager.handle_filled_order_event(txid="txid1")
+
+    mock_get_orders_info_with_retry.assert_called_once()
+    mock_handle_arbitrage.assert_not_called()
+
+
 @mock.patch.object(OrderManager, "get_orders_info_with_retry")
 @mock.patch.object(OrderManager, "handle_arbitrage")
 def test_handle_filled_order_event_buy_dry_run(
@@ -891,7 +1229,7 @@ def test_handle_filled_order_event_buy_dry_run(
     """
     mock_get_orders_info_with_retry.return_value = {
         "descr": {"pair": "BTCUSD", "type": "buy", "price": 50000.0},
-        "status": "closed",
+        "status": "open",
         "userref": 13456789,
         "vol_exec": 0.1,
     }
@@ -899,10 +1237,63 @@ def test_handle_filled_order_event_buy_dry_run(
     strategy.get_order_price.return_value = 50000.0
     order_manager.handle_filled_order_event(txid="txid1")
 
+    # == No waiting for the order to be closed upstream
+    mock_get_orders_info_with_retry.assert_called_once()
     strategy.t.send_to_telegram.assert_not_called()
     mock_handle_arbitrage.assert_not_called()
 
 
+# ==============================================================================
+# handle_closed_order
+##
+
+
+@mock.patch.object(OrderManager, "handle_arbitrage")
+def test_handle_closed_order_sell_place_new_buy(
+    mock_handle_arbitrage: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test handling a closed sell order for the case of another existing sell
+    order, so that a new buy order is placed.
+    """
+    strategy.get_order_price.return_value = 49000.0
+    strategy.orderbook.count_side.return_value = 1
+
+    order_manager.handle_closed_order(txid="txid2", side="sell", price=48000.0)
+
+    strategy.orderbook.count_side.assert_called_once_with(
+        side="sell",
+        exclude_txid="txid2",
+    )
+    strategy.get_order_price.assert_called_once_with(side="buy", last_price=48000.0)
+    mock_handle_arbitrage.assert_called_once_with(
+        side="buy",
+        order_price=49000.0,
+        txid_to_delete="txid2",
+    )
+    strategy.orderbook.remove.assert_not_called()
+
+
+@mock.patch.object(OrderManager, "handle_arbitrage")
+def test_handle_closed_order_sell_no_new_buy(
+    mock_handle_arbitrage: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test handling a closed sell order for the case of not existing other sell
+    orders, so that the order is only removed from the orderbook.
+    """
+    strategy.orderbook.count_side.return_value = 0
+
+    order_manager.handle_closed_order(txid="txid2", side="sell", price=48000.0)
+
+    mock_handle_arbitrage.assert_not_called()
+    strategy.orderbook.remove.assert_called_once_with(filters={"txid": "txid2"})
+
+
 # ==============================================================================
 # handle_cancel_order
 ##
@@ -935,18 +1326,55 @@ def test_handle_cancel_order_partly_filled_create_sell_order(
     # == Ensure removal from the orderbook
     strategy.orderbook.remove.assert_called_once_with(filters={"txid": "txid1"})
 
-    # == Ensure to first update the volume that was partly filled
-    strategy.configuration.update.assert_any_call({"vol_of_unfilled_remaining": 0.2})
-
     # Ensure the exceeding volume is sold
     mock_handle_arbitrage.assert_called_once()
 
-    # == Ensure to update the saved volume
-    strategy.configuration.update.assert_any_call(
+    # == Ensure the configuration is read once and only the reset is written
+    strategy.configuration.get.assert_called_once()
+    strategy.configuration.update.assert_called_once_with(
         {"vol_of_unfilled_remaining": 0, "vol_of_unfilled_remaining_max_price": 0},
     )
 
-    assert strategy.configuration.update.call_count == 2
+
+@mock.patch.object(OrderManager, "handle_arbitrage")
+def test_handle_cancel_order_partly_filled_sell_failing(
+    mock_handle_arbitrage: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test that the executed volume of a cancelled order is saved even if placing
+    the sell order for the collected funds fails.
+    """
+    strategy.amount_per_grid = 100.0
+    strategy.user.get_orders_info.return_value = {
+        "txid1": {
+            "descr": {"pair": "BTCUSD", "type": "buy", "price": "50000"},
+            "vol_exec": "0.1",
+            "userref": 13456789,
+        },
+    }
+    strategy.configuration.get.return_value = {
+        "vol_of_unfilled_remaining": 0,
+        "vol_of_unfilled_remaining_max_price": 0,
+    }
+    mock_handle_arbitrage.side_effect = GridBotStateError
+
+    with pytest.raises(GridBotStateError):
+        order_manager.handle_cancel_order(txid="txid1")
+
+    # == Ensure the sell order is placed outside of the transaction
+    strategy.database.transaction.return_value.__exit__.assert_called_once_with(
+        None,
+        None,
+        None,
+    )
+    strategy.configuration.update.assert_called_once_with(
+        {
+            "vol_of_unfilled_remaining": 0.1,
+            "vol_of_unfilled_remaining_max_price": 50000.0,
+        },
+    )
 
 
 @mock.patch.object(OrderManager, "handle_arbitrage")
@@ -1006,7 +1434,7 @@ def test_handle_cancel_order_partly_filled(
     a new sell order.
     """
     # Ensure the grid amount to higher than the volume unfilled
-    strategy.amount_per_grid = 10000.0
+    strategy.amount_per_grid = 20000.0
     strategy.user.get_orders_info.return_value = {
         "txid1": {
             "descr": {"pair": "BTCUSD", "type": "buy", "price": "50000"},
@@ -1030,43 +1458,90 @@ def test_handle_cancel_order_partly_filled(
     mock_handle_arbitrage.assert_not_called()
 
 
-@mock.patch.object(OrderManager, "handle_cancel_order")
 def test_cancel_all_open_buy_orders(
-    mock_handle_cancel_order: mock.Mock,
     order_manager: OrderManager,
     strategy: mock.Mock,
 ) -> None:
-    """Test canceling all open buy orders."""
+    """Test canceling all open buy orders via a batch request."""
 
     # Check for multiple orders in the orderbook
     strategy.user.get_open_orders.return_value = {
         "open": {
             "txid1": {
-                "descr": {
-                    "type": "buy",
-                    "pair": "BTCUSD",
-                },
+                "descr": {"type": "buy", "pair": "BTCUSD", "price": "50000"},
+                "userref": 13456789,
+                "vol_exec": "0",
             },
             "txid2": {
-                "descr": {
-                    "type": "buy",
-                    "pair": "BTCUSD",
-                },
+                "descr": {"type": "buy", "pair": "BTCUSD", "price": "49000"},
+                "userref": 13456789,
+                "vol_exec": "0.001",
             },
             "txid3": {
-                "descr": {
-                    "type": "buy",
-                    "pair": "ETHUSD",
-                },
+                "descr": {"type": "buy", "pair": "ETHUSD", "price": "3000"},
+                "userref": 13456789,
+                "vol_exec": "0",
             },
             "txid4": {
-                "descr": {
-                    "type": "sell",
-                    "pair": "BTCUSD",
-                },
+                "descr": {"type": "sell", "pair": "BTCUSD", "price": "51000"},
+                "userref": 13456789,
+                "vol_exec": "0",
             },
         },
     }
+    # txid2 was filled further until it was cancelled
+    strategy.user.get_orders_info.return_value = {
+        "txid1": {
+            "descr": {"type": "buy", "pair": "BTCUSD", "price": "50000"},
+            "userref": 13456789,
+            "status": "canceled",
+            "vol_exec": "0",
+        },
+        "txid2": {
+            "descr": {"type": "buy", "pair": "BTCUSD", "price": "49000"},
+            "userref": 13456789,
+            "status": "canceled",
+            "vol_exec": "0.002",
+        },
+    }
+    strategy.configuration.get.return_value = {
+        "vol_of_unfilled_remaining": 0.0,
+        "vol_of_unfilled_remaining_max_price": 0.0,
+    }
+
+    order_manager.cancel_all_open_buy_orders()
+
+    strategy.trade.cancel_order_batch.assert_called_once_with(
+        orders=["txid1", "txid2"],
+    )
+    strategy.user.get_orders_info.assert_called_once_with(txid=["txid1", "txid2"])
+    strategy.trade.cancel_order.assert_not_called()
+    strategy.orderbook.remove.assert_any_call(filters={"txid": "txid1"})
+    strategy.orderbook.remove.assert_any_call(filters={"txid": "txid2"})
+    strategy.orderbook.remove.assert_called_with(filters={"side": "buy"})
+
+    # == The partly filled order's final volume is saved to be sold later
+    strategy.configuration.update.assert_called_once_with(
+        {
+            "vol_of_unfilled_remaining": 0.002,
+            "vol_of_unfilled_remaining_max_price": 49000.0,
+        },
+    )
+
+
+@mock.patch.object(OrderManager, "handle_cancel_order")
+def test_cancel_all_open_buy_orders_single(
+    mock_handle_cancel_order: mock.Mock,
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """Test canceling a single open buy order without a batch request."""
+    strategy.user.get_open_orders.return_value = {
+        "open": {
+            "txid1": {"descr": {"type": "buy", "pair": "BTCUSD"}},
+            "txid2": {"descr": {"type": "sell", "pair": "BTCUSD"}},
+        },
+    }
 
     with mock.patch(
         "kraken_infinity_grid.order_management.sleep",
@@ -1074,9 +1549,9 @@ def test_cancel_all_open_buy_orders(
     ):
         order_manager.cancel_all_open_buy_orders()
 
-    mock_handle_cancel_order.assert_any_call(txid="txid1")
-    mock_handle_cancel_order.assert_any_call(txid="txid2")
-    assert mock_handle_cancel_order.call_count == 2
+    mock_handle_cancel_order.assert_called_once_with(txid="txid1")
+    strategy.trade.cancel_order_batch.assert_not_called()
+    strategy.orderbook.remove.assert_called_once_with(filters={"side": "buy"})
 
 
 @mock.patch("kraken_infinity_grid.order_management.sleep", return_value=None)
@@ -1093,6 +1568,32 @@ def test_get_orders_info_with_retry_success(
     mock_sleep.assert_not_called()
 
 
+def test_get_orders_info_with_retry_cached(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """Test that only the details of finalized orders are served from memory."""
+    strategy.user.get_orders_info.side_effect = [
+        {"txid1": {"status": "open"}},
+        {"txid1": {"status": "closed"}},
+        {"txid1": {"status": "closed", "vol_exec": "0.1"}},
+    ]
+    assert order_manager.get_orders_info_with_retry(txid="txid1")["status"] == "open"
+    assert order_manager.get_orders_info_with_retry(txid="txid1")["status"] == "closed"
+    assert order_manager.get_orders_info_with_retry(txid="txid1")["status"] == "closed"
+    assert strategy.user.get_orders_info.call_count == 2
+
+    # Bypassing the cache fetches and caches the latest details.
+    assert (
+        order_manager.get_orders_info_with_retry(txid="txid1", use_cache=False)[
+            "vol_exec"
+        ]
+        == "0.1"
+    )
+    assert order_manager.get_orders_info_with_retry(txid="txid1")["vol_exec"] == "0.1"
+    assert strategy.user.get_orders_info.call_count == 3
+
+
 @mock.patch("kraken_infinity_grid.order_management.sleep", return_value=None)
 def test_get_orders_info_with_retry_retry_success(
     mock_sleep: mock.Mock,
@@ -1126,3 +1627,62 @@ def test_get_orders_info_with_retry_failure(
     assert strategy.state_machine.state == States.ERROR
     assert strategy.user.get_orders_info.call_count == 3
     assert mock_sleep.call_count == 3
+
+
+def test_get_orders_info_bulk(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test retrieving multiple orders in chunks while falling back to single
+    requests for orders that are not yet available.
+    """
+    txids = [f"txid{i}" for i in range(51)]
+    strategy.user.get_orders_info.side_effect = [
+        {txid: {"status": "closed"} for txid in txids[:50]},
+        {},
+    ]
+
+    with mock.patch.object(
+        order_manager,
+        "get_orders_info_with_retry",
+        return_value={"status": "canceled", "txid": "txid50"},
+    ) as mock_get_orders_info_with_retry:
+        result = order_manager.get_orders_info_bulk(txids=txids)
+
+    assert strategy.user.get_orders_info.call_count == 2
+    strategy.user.get_orders_info.assert_any_call(txid=txids[:50])
+    strategy.user.get_orders_info.assert_any_call(txid=["txid50"])
+    mock_get_orders_info_with_retry.assert_called_once_with(txid="txid50")
+    assert len(result) == 51
+    assert result["txid0"] == {"status": "closed", "txid": "txid0"}
+    assert result["txid50"] == {"status": "canceled", "txid": "txid50"}
+
+
+def test_get_orders_info_bulk_failing_chunk(
+    order_manager: OrderManager,
+    strategy: mock.Mock,
+) -> None:
+    """
+    Test that the orders of a chunk whose request failed are fetched
+    individually instead of failing the whole query.
+    """
+    txids = ["txid1", "txid2"]
+    strategy.user.get_orders_info.side_effect = ConnectionError
+
+    with mock.patch.object(
+        order_manager,
+        "get_orders_info_with_retry",
+        side_effect=lambda txid: {"status": "closed", "txid": txid},
+    ) as mock_get_orders_info_with_retry:
+        result = order_manager.get_orders_info_bulk(txids=txids)
+
+    strategy.user.get_orders_info.assert_called_once_with(txid=txids)
+    assert mock_get_orders_info_with_retry.call_args_list == [
+        mock.call(txid="txid1"),
+        mock.call(txid="txid2"),
+    ]
+    assert result == {
+        "txid1": {"status": "closed", "txid": "txid1"},
+        "txid2": {"status": "closed", "txid": "txid2"},
+    }
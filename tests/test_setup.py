@@ -7,6 +7,7 @@
 
 """Unit tests for the SetupManager class."""
 
+from decimal import Decimal
 from unittest import mock
 
 import pytest
@@ -79,7 +80,6 @@ def test_update_order_book_handle_closed_buy_order(
     strategy.symbol = "BTC/USD"
     strategy.quote_currency = "USD"
     strategy.base_currency = "BTC"
-    strategy.get_order_price.return_value = 51000.0
 
     closed_order = {
         "descr": {"type": "buy"},
@@ -92,70 +92,30 @@ def test_update_order_book_handle_closed_buy_order(
         closed_order,
     )
 
-    strategy.t.send_to_telegram.assert_called_once()
-    strategy.om.handle_arbitrage.assert_called_once_with(
-        side="sell",
-        order_price=51000.0,
-        txid_to_delete="txid1",
-    )
-
-
-def test_update_order_book_handle_closed_sell_order_trigger_new_buy(
-    setup_manager: SetupManager,
-    strategy: mock.Mock,
-) -> None:
-    """
-    Test handling a closed sell order for the case of another existing sell
-    order.
-
-    We need to distinguish between the case of having another sell order and the
-    case of not having another sell order since if there is no other sell order,
-    the algorithm would cancel the placed buy order anyways, so that's why we
-    need to test both cases.
-    """
-    strategy.symbol = "BTC/USD"
-    strategy.quote_currency = "USD"
-    strategy.base_currency = "BTC"
-    strategy.get_order_price.return_value = 49000.0
-    strategy.orderbook.count.return_value = 1
-
-    closed_order = {
-        "descr": {"type": "sell"},
-        "price": "48000",
-        "vol_exec": "0.1",
-        "txid": "txid2",
-    }
-
-    setup_manager._SetupManager__update_order_book_handle_closed_order(
-        closed_order,
+    strategy.t.send_to_telegram.assert_called_once_with(
+        "✅ BTC/USD: Buy order executed"
+        "\n ├ Price » 50000 USD"
+        "\n ├ Size » 0.1 BTC"
+        "\n └ Size in USD » 5000.0",
     )
-
-    strategy.t.send_to_telegram.assert_called_once()
-    strategy.om.handle_arbitrage.assert_called_once_with(
+    strategy.om.handle_closed_order.assert_called_once_with(
+        txid="txid1",
         side="buy",
-        order_price=49000.0,
-        txid_to_delete="txid2",
+        price=50000.0,
     )
 
 
-def test_update_order_book_handle_closed_sell_order_no_new_buy(
+def test_update_order_book_handle_closed_sell_order(
     setup_manager: SetupManager,
     strategy: mock.Mock,
 ) -> None:
     """
-    Test handling a closed sell order for the case of not existing other sell
-    orders.
-
-    We need to distinguish between the case of having another sell order and the
-    case of not having another sell order since if there is no other sell order,
-    the algorithm would cancel the placed buy order anyways, so that's why we
-    need to test both cases.
+    Test handling a closed sell order which will be passed to the OrderManager
+    in order to eventually place a new buy order.
     """
     strategy.symbol = "BTC/USD"
     strategy.quote_currency = "USD"
     strategy.base_currency = "BTC"
-    strategy.get_order_price.return_value = 49000.0
-    strategy.orderbook.count.return_value = 0
 
     closed_order = {
         "descr": {"type": "sell"},
@@ -169,8 +129,10 @@ def test_update_order_book_handle_closed_sell_order_no_new_buy(
     )
 
     strategy.t.send_to_telegram.assert_called_once()
-    strategy.orderbook.remove.assert_called_once_with(
-        filters={"txid": "txid2"},
+    strategy.om.handle_closed_order.assert_called_once_with(
+        txid="txid2",
+        side="sell",
+        price=48000.0,
     )
 
 
@@ -193,16 +155,12 @@ def test_update_order_book(
         },
     }
     strategy.altname = "BTC/USD"
-    strategy.orderbook.get_orders.side_effect = [
-        # This is the local order book:
-        [{"txid": "txid3"}, {"txid": "txid4"}],
-        # This are the updated local orders:
-        [{"txid": "txid3"}, {"txid": "txid4"}],
-    ]
-    strategy.om.get_orders_info_with_retry.side_effect = [
-        {"status": "canceled"},
-        {"status": "closed"},
-    ]
+    # This is the local order book:
+    strategy.orderbook.get_orders.return_value = [{"txid": "txid3"}, {"txid": "txid4"}]
+    strategy.om.get_orders_info_bulk.return_value = {
+        "txid3": {"status": "canceled"},
+        "txid4": {"status": "closed"},
+    }
 
     setup_manager._SetupManager__update_order_book_handle_closed_order = mock.Mock()
     setup_manager._SetupManager__update_order_book()
@@ -215,6 +173,13 @@ def test_update_order_book(
         {"descr": {"pair": "BTC/USD"}, "txid": "txid2"},
     )
     assert strategy.orderbook.add.call_count == 2
+    # Ensure that the local orderbook is only read once
+    strategy.orderbook.get_orders.assert_called_once_with()
+
+    # Ensure that all closed orders are fetched at once
+    strategy.om.get_orders_info_bulk.assert_called_once_with(
+        txids=["txid3", "txid4"],
+    )
 
     # Ensure that a filled order triggers the correct handling
     strategy.orderbook.remove.assert_called_once_with(filters={"txid": "txid3"})
@@ -246,6 +211,10 @@ def test_check_asset_pair_parameter(
             "base": "XXBT",
             "quote": "ZEUR",
             "cost_decimals": 5,
+            "pair_decimals": 1,
+            "lot_decimals": 8,
+            "ordermin": "0.00005",
+            "costmin": "0.5",
         },
     }
     strategy.symbol = "BTC/USD"
@@ -259,7 +228,12 @@ def test_check_asset_pair_parameter(
     assert strategy.zbase_currency == "XXBT"
     assert strategy.xquote_currency == "ZEUR"
     assert strategy.cost_decimals == 5
+    assert strategy.pair_decimals == 1
+    assert strategy.lot_decimals == 8
+    assert strategy.ordermin == Decimal("0.00005")
+    assert strategy.costmin == Decimal("0.5")
     assert strategy.amount_per_grid_plus_fee == pytest.approx(order_size)
+    assert strategy.sell_fee_factor == 1 - 2 * Decimal(asset_fee)
 
 
 def test_check_configuration_changes(
@@ -273,8 +247,10 @@ def test_check_configuration_changes(
 
     setup_manager._SetupManager__check_configuration_changes()
 
-    strategy.configuration.update.assert_any_call({"amount_per_grid": 10})
-    strategy.configuration.update.assert_any_call({"interval": 2})
+    strategy.configuration.get.assert_called_once()
+    strategy.configuration.update.assert_called_once_with(
+        {"amount_per_grid": 10, "interval": 2},
+    )
     strategy.om.cancel_all_open_buy_orders.assert_called_once()
 
 
@@ -289,7 +265,6 @@ def test_check_configuration_changes_no_changes(
 
     setup_manager._SetupManager__check_configuration_changes()
 
-    strategy.configuration.update.assert_not_called()
     strategy.configuration.update.assert_not_called()
     strategy.om.cancel_all_open_buy_orders.assert_not_called()
 
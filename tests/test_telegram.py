@@ -8,9 +8,11 @@
 """Unit tests for the Telegram class."""
 
 import logging
+import threading
 from unittest import mock
 
 import pytest
+import requests
 
 from kraken_infinity_grid.telegram import Telegram
 
@@ -32,7 +34,7 @@ def telegram() -> Telegram:
     )
 
 
-@mock.patch("kraken_infinity_grid.telegram.requests.post")
+@mock.patch("kraken_infinity_grid.telegram.requests.Session.post")
 def test_send_to_telegram(
     mock_post: mock.Mock,
     telegram: Telegram,
@@ -42,6 +44,7 @@ def test_send_to_telegram(
     """Test sending a regular message to Telegram."""
     mock_post.return_value.status_code = 200
     telegram.send_to_telegram("Test message")
+    telegram.close()
     mock_post.assert_called_once_with(
         url=f"https://api.telegram.org/bot{telegram._Telegram__telegram_token}/sendMessage",
         params={
@@ -54,7 +57,7 @@ def test_send_to_telegram(
     assert "Test message" in caplog.text
 
 
-@mock.patch("kraken_infinity_grid.telegram.requests.post")
+@mock.patch("kraken_infinity_grid.telegram.requests.Session.post")
 def test_send_to_telegram_exception(
     mock_post: mock.Mock,
     telegram: Telegram,
@@ -75,7 +78,7 @@ def test_send_to_telegram_exception(
     assert "Exception message" in caplog.text
 
 
-@mock.patch("kraken_infinity_grid.telegram.requests.post")
+@mock.patch("kraken_infinity_grid.telegram.requests.Session.post")
 def test_send_to_telegram_failure(
     mock_post: mock.Mock,
     telegram: Telegram,
@@ -84,9 +87,101 @@ def test_send_to_telegram_failure(
     """Test handling of a failed message send to Telegram."""
     mock_post.return_value.status_code = 400
     telegram.send_to_telegram("Test message")
+    telegram.close()
     assert "Failed to send message to Telegram" in caplog.text
 
 
+@mock.patch("kraken_infinity_grid.telegram.requests.Session.post")
+def test_send_to_telegram_queued(
+    mock_post: mock.Mock,
+    telegram: Telegram,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """
+    Test that regular messages are sent in order by the notifier thread and
+    that failing requests do not stop it.
+    """
+    mock_post.side_effect = [
+        requests.exceptions.ConnectionError("Connection refused"),
+        mock.Mock(status_code=200),
+    ]
+    telegram.send_to_telegram("First message")
+    telegram.send_to_telegram("Second message")
+    telegram.close()
+
+    assert [call.kwargs["params"]["text"] for call in mock_post.call_args_list] == [
+        "First message",
+        "Second message",
+    ]
+    assert "Failed to send message to Telegram: Connection refused" in caplog.text
+
+
+@mock.patch("kraken_infinity_grid.telegram.requests.Session.post")
+def test_send_to_telegram_conflate_status_updates(
+    mock_post: mock.Mock,
+    telegram: Telegram,
+) -> None:
+    """
+    Test that only the latest of multiple pending status updates is sent while
+    regular messages are kept.
+    """
+    sending = threading.Event()
+    release = threading.Event()
+
+    def post(**kwargs: dict) -> mock.Mock:  # noqa: ARG001
+        sending.set()
+        release.wait(timeout=5)
+        return mock.Mock(status_code=200)
+
+    mock_post.side_effect = post
+    telegram.send_to_telegram("Order executed")
+    assert sending.wait(timeout=5)
+    telegram.send_to_telegram("Status 1", status_update=True)
+    telegram.send_to_telegram("Status 2", status_update=True)
+    telegram.send_to_telegram("Order executed again")
+    release.set()
+    telegram.close()
+
+    assert [call.kwargs["params"]["text"] for call in mock_post.call_args_list] == [
+        "Order executed",
+        "Status 2",
+        "Order executed again",
+    ]
+
+
+@mock.patch("kraken_infinity_grid.telegram.requests.Session.post")
+def test_send_to_telegram_concurrent(
+    mock_post: mock.Mock,
+    telegram: Telegram,
+) -> None:
+    """
+    Test that messages sent concurrently from multiple threads are handled by
+    a single notifier thread.
+    """
+    mock_post.return_value.status_code = 200
+    barrier = threading.Barrier(8)
+
+    def send(i: int) -> None:
+        barrier.wait(timeout=5)
+        telegram.send_to_telegram(f"Message {i}")
+
+    with mock.patch(
+        "kraken_infinity_grid.telegram.Thread",
+        wraps=threading.Thread,
+    ) as mock_thread:
+        senders = [threading.Thread(target=send, args=(i,)) for i in range(8)]
+        for sender in senders:
+            sender.start()
+        for sender in senders:
+            sender.join()
+        telegram.close()
+
+    mock_thread.assert_called_once()
+    assert sorted(
+        call.kwargs["params"]["text"] for call in mock_post.call_args_list
+    ) == [f"Message {i}" for i in range(8)]
+
+
 @mock.patch("kraken_infinity_grid.telegram.Telegram.send_to_telegram")
 def test_send_telegram_update(
     mock_send_to_telegram: mock.Mock,
@@ -111,13 +206,14 @@ def test_send_telegram_update(
     telegram._Telegram__s.amount_per_grid = 10.0
     telegram._Telegram__s.cost_decimals = 5
     telegram._Telegram__s.orderbook.count.return_value = 5
-    telegram._Telegram__s.orderbook.get_orders.side_effect = [
-        ({"side": "sell", "price": 50500.0}, {"side": "sell", "price": 51000.0}),
-        ({"side": "buy", "price": 49000.0},),
+    telegram._Telegram__s.orderbook.get_prices.side_effect = [
+        [50500.0, 51000.0],
+        [49000.0, 48000.0],
     ]
 
     telegram.send_telegram_update()
     assert mock_send_to_telegram.called
+    telegram._Telegram__s.configuration.get.assert_called_once()
 
     # Check parts of the message format. This is not a beauty but ok for now.
     message = mock_send_to_telegram.call_args[0][0]
@@ -138,4 +234,83 @@ def test_send_telegram_update(
     assert " │  ┌[ 51000.0 (+2.00%)" in message
     assert " │  ├[ 50500.0 (+1.00%)" in message
     assert " └──┼> 50000.0" in message
-    assert "    └[ 49000.0 (-2.00%)" in message
+    assert "    ├[ 49000.0 (-2.00%)" in message
+    assert "    └[ 48000.0 (-4.00%)" in message
+
+
+@pytest.mark.parametrize(
+    ("sell_prices", "buy_prices", "expected_orders"),
+    [
+        ([], [], "└───┬> 50000.0\n\n```"),
+        (
+            [50500.0],
+            [],
+            " │  ┌[ 50500.0 (+1.00%)\n └──┼> 50000.0\n\n```",
+        ),
+        (
+            [],
+            [49500.0, 49000.0],
+            (
+                "└───┬> 50000.0"
+                "\n    ├[ 49500.0 (-1.00%)"
+                "\n    └[ 49000.0 (-2.00%)"
+                "\n```"
+            ),
+        ),
+    ],
+)
+@mock.patch("kraken_infinity_grid.telegram.Telegram.send_to_telegram")
+def test_send_telegram_update_message(
+    mock_send_to_telegram: mock.Mock,
+    telegram: Telegram,
+    sell_prices: list[float],
+    buy_prices: list[float],
+    expected_orders: str,
+) -> None:
+    """Test the exact status update message, including its line breaks."""
+    telegram._Telegram__s.get_balances.return_value = {
+        "base_balance": 1.0,
+        "quote_balance": 100.0,
+        "quote_available": 50.0,
+        "base_available": 0.5,
+    }
+    telegram._Telegram__s.symbol = "BTC/USD"
+    telegram._Telegram__s.ticker.last = 50000.0
+    telegram._Telegram__s.quote_currency = "USD"
+    telegram._Telegram__s.base_currency = "BTC"
+    telegram._Telegram__s.configuration.get.return_value = {
+        "vol_of_unfilled_remaining": 0.0,
+    }
+    telegram._Telegram__s.investment = 1000.0
+    telegram._Telegram__s.max_investment = 2000.0
+    telegram._Telegram__s.amount_per_grid = 10.0
+    telegram._Telegram__s.cost_decimals = 5
+    telegram._Telegram__s.orderbook.count.return_value = 3
+    telegram._Telegram__s.orderbook.get_prices.side_effect = [
+        sell_prices,
+        buy_prices,
+    ]
+
+    telegram.send_telegram_update()
+
+    assert mock_send_to_telegram.call_args[0][0] == (
+        "👑 BTC/USD"
+        "\n└ Price » 50000.0 USD"
+        "\n"
+        "\n⚜️ Account"
+        "\n├ Total BTC » 1.0"
+        "\n├ Total USD » 100.0"
+        "\n├ Available USD » 50.0"
+        "\n├ Available BTC » 0.5"
+        "\n├ Unfilled surplus of BTC » 0.0"
+        "\n├ Wealth » 50100.0 USD"
+        "\n└ Investment » 1000.0 / 2000.0 USD"
+        "\n"
+        "\n💠 Orders"
+        "\n├ Amount per Grid » 10.0 USD"
+        "\n└ Open orders » 3"
+        "\n"
+        "\n```"
+        "\n 🏷️ Price in USD"
+        f"\n{expected_orders}"
+    )